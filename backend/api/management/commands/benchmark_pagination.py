@@ -0,0 +1,85 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.pagination import KeysetPagination, LimitPageNumberPagination
+from recipes.models import Recipe
+from users.models import User
+
+BATCH_SIZE = 10000
+URL = '/api/recipes/'
+
+
+class Command(BaseCommand):
+    help = ('Сравнение постраничной пагинации и пагинации по курсору '
+            'на синтетических рецептах. Все созданные записи откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--pages', nargs='+', type=int,
+                            default=(1, 100, 10000, 100000))
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def measure(self, paginator, request, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(paginator.paginate_queryset(queryset, Request(request)))
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def fill(self, count):
+        author = User.objects.create(
+            email='benchmark@foodgram.local', username='benchmark'
+        )
+        while count > 0:
+            batch = min(count, BATCH_SIZE)
+            Recipe.objects.bulk_create(
+                Recipe(author=author, name=f'Рецепт {number}', text='')
+                for number in range(batch)
+            )
+            count -= batch
+
+    def cursor_url(self, position):
+        paginator = KeysetPagination()
+        paginator.base_url = URL
+        return paginator.encode_cursor(Cursor(0, False, str(position)))
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        limit = options['limit']
+        with transaction.atomic():
+            self.fill(options['recipes'] - Recipe.objects.count())
+            queryset = Recipe.objects.all()
+            total = queryset.count()
+            for page in options['pages']:
+                if (page - 1) * limit >= total:
+                    continue
+                page_number = self.measure(
+                    LimitPageNumberPagination(),
+                    factory.get(URL, {'page': page, 'limit': limit}),
+                    queryset, options['repeat']
+                )
+                if page == 1:
+                    request = factory.get(URL, {'cursor': '', 'limit': limit})
+                else:
+                    position = queryset.order_by('-id').values_list(
+                        'id', flat=True
+                    )[(page - 1) * limit - 1]
+                    request = factory.get(
+                        self.cursor_url(position), {'limit': limit}
+                    )
+                keyset = self.measure(
+                    KeysetPagination(), request, queryset, options['repeat']
+                )
+                self.stdout.write(
+                    f'{total} рецептов, страница {page:>7}: '
+                    f'page {page_number:8.2f} мс, cursor {keyset:8.2f} мс'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,122 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.models import Ingredient, Recipe, RecipeIngredientRelation, Tag
+from recipes.utils import sync_recipe_relations
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сравнение записей в базу при изменении рецепта: очистка и '
+            'повторная вставка против обновления по разнице. '
+            'Все созданные записи откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=15)
+        parser.add_argument('--tags', type=int, default=3)
+
+    def fill(self, ingredients, tags):
+        author = User.objects.create(
+            email='benchmark@foodgram.local', username='benchmark'
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(ingredients + 1)
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', color=f'#{number:06d}',
+                slug=f'benchmark-{number}')
+            for number in range(tags + 1)
+        )
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='', cooking_time=10
+        )
+        ingredient_ids = list(Ingredient.objects.filter(
+            name__startswith='Ингредиент '
+        ).order_by('pk').values_list('pk', flat=True))
+        tag_ids = list(Tag.objects.filter(
+            slug__startswith='benchmark-'
+        ).order_by('pk').values_list('pk', flat=True))
+        return recipe, ingredient_ids, tag_ids
+
+    def scenarios(self, ingredient_ids, tag_ids):
+        """Типичные правки: количества и теги до и после изменения."""
+        amounts = {pk: 100 for pk in ingredient_ids[:-1]}
+        tags = tag_ids[:-1]
+        first, spare = ingredient_ids[0], ingredient_ids[-1]
+        swapped = {
+            **{pk: 100 for pk in ingredient_ids[1:-1]}, spare: 100
+        }
+        return (
+            ('только текст', amounts, tags, amounts, tags),
+            ('одно количество', amounts, tags,
+             {**amounts, first: 200}, tags),
+            ('замена ингредиента', amounts, tags, swapped, tags),
+            ('замена тега', amounts, tags, amounts,
+             tag_ids[1:]),
+        )
+
+    @staticmethod
+    def set_relations(recipe, amounts, tags):
+        RecipeIngredientRelation.objects.filter(recipe=recipe).delete()
+        RecipeIngredientRelation.objects.bulk_create(
+            RecipeIngredientRelation(
+                recipe=recipe, ingredient_id=pk, amount=amount
+            )
+            for pk, amount in amounts.items()
+        )
+        recipe.tags.set(tags)
+
+    @staticmethod
+    def clear_and_insert(recipe, amounts, tags):
+        """Прежний способ из RecipeEditSerializer.update."""
+        recipe.tags.clear()
+        recipe.tags.set(tags)
+        recipe.ingredients.clear()
+        RecipeIngredientRelation.objects.bulk_create(
+            RecipeIngredientRelation(
+                recipe=recipe, ingredient_id=pk, amount=amount
+            )
+            for pk, amount in amounts.items()
+        )
+
+    @staticmethod
+    def by_diff(recipe, amounts, tags):
+        sync_recipe_relations({recipe.pk: (tags, amounts)})
+
+    def measure(self, update, recipe, amounts, tags):
+        writes = rows = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal writes, rows
+            result = execute(sql, params, many, context)
+            if not sql.lstrip().upper().startswith('SELECT'):
+                writes += 1
+                rows += max(context['cursor'].rowcount, 0)
+            return result
+
+        with connection.execute_wrapper(count):
+            update(recipe, amounts, tags)
+        return writes, rows
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipe, ingredient_ids, tag_ids = self.fill(
+                options['ingredients'], options['tags']
+            )
+            for name, before, before_tags, after, after_tags in (
+                self.scenarios(ingredient_ids, tag_ids)
+            ):
+                results = []
+                for update in (self.clear_and_insert, self.by_diff):
+                    self.set_relations(recipe, before, before_tags)
+                    results.append(
+                        self.measure(update, recipe, after, after_tags)
+                    )
+                (old_writes, old_rows), (new_writes, new_rows) = results
+                self.stdout.write(
+                    f'{name:<20}: очистка {old_writes} запросов, '
+                    f'{old_rows} строк; по разнице {new_writes} запросов, '
+                    f'{new_rows} строк'
+                )
+            transaction.set_rollback(True)
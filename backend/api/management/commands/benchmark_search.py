@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import Recipe
+from recipes.search import (full_text_search_enabled, search_recipes,
+                            update_search_vector)
+from users.models import User
+
+WORDS = (
+    'суп', 'борщ', 'салат', 'пирог', 'каша', 'котлеты', 'рагу', 'плов',
+    'курица', 'говядина', 'рыба', 'картофель', 'капуста', 'морковь',
+    'грибы', 'сыр', 'томаты', 'лук', 'чеснок', 'яблоки', 'творог',
+    'запечённый', 'домашний', 'быстрый', 'острый', 'сливочный',
+    'овощной', 'летний', 'праздничный', 'постный',
+)
+BATCH_SIZE = 5000
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = ('Замер времени поиска рецептов на синтетических данных. '
+            'Все созданные записи откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int,
+                            default=(1000, 10000, 100000))
+        parser.add_argument('--query', default='сливочный суп')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def measure(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset[:PAGE_SIZE])
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def fill(self, author, count):
+        while count > 0:
+            batch = min(count, BATCH_SIZE)
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=' '.join(random.sample(WORDS, 3)),
+                    text=' '.join(random.choices(WORDS, k=40)),
+                ) for _ in range(batch)
+            )
+            count -= batch
+
+    def handle(self, *args, **options):
+        query = options['query']
+        if not full_text_search_enabled():
+            self.stdout.write(self.style.WARNING(
+                'База данных не PostgreSQL: замеряется только icontains.'
+            ))
+        with transaction.atomic():
+            author = User.objects.create(
+                email='benchmark@foodgram.local', username='benchmark'
+            )
+            total = Recipe.objects.count()
+            for size in sorted(options['sizes']):
+                if size > total:
+                    self.fill(author, size - total)
+                    update_search_vector(Recipe.objects.filter(author=author))
+                    total = size
+                fallback = self.measure(
+                    Recipe.objects.filter(
+                        Q(name__icontains=query) | Q(text__icontains=query)
+                    ),
+                    options['repeat']
+                )
+                search = self.measure(
+                    search_recipes(Recipe.objects.all(), query),
+                    options['repeat']
+                )
+                self.stdout.write(
+                    f'{total:>9} рецептов: search {search:8.2f} мс, '
+                    f'icontains {fallback:8.2f} мс'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+
+from recipes.images import build_renditions
+from recipes.models import Recipe
+
+
+def build_recipe_renditions(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None:
+        return recipe_id, 'рецепт удалён'
+    try:
+        build_renditions(recipe)
+    except (OSError, ValueError) as error:
+        return recipe_id, str(error)
+    return recipe_id, None
+
+
+class Command(BaseCommand):
+    help = ('Готовит уменьшенные копии картинок для существующих рецептов '
+            'параллельно на всех ядрах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count())
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересобрать копии и для рецептов, у которых они уже есть.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            recipes = recipes.exclude(renditions_source=F('image'))
+        recipe_ids = list(recipes.values_list('id', flat=True))
+        # Процессы-потомки должны открыть свои соединения с базой.
+        connections.close_all()
+        failed = 0
+        with ProcessPoolExecutor(options['processes']) as executor:
+            for recipe_id, error in executor.map(
+                build_recipe_renditions, recipe_ids, chunksize=16
+            ):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'Рецепт {recipe_id}: {error}')
+        self.stdout.write(
+            f'Обработано рецептов: {len(recipe_ids) - failed}, '
+            f'ошибок: {failed}'
+        )
@@ -1,19 +1,109 @@
 import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from recipes.ingredient_index import invalidate_ingredient_index
 from recipes.models import Ingredient
 
+HEADER = ('name', 'measurement_unit')
+BATCH_SIZE = 1000
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as csvfile:
+        for row in csv.reader(csvfile):
+            if row and tuple(row[:2]) != HEADER:
+                yield row[0], row[1] if len(row) > 1 else ''
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as jsonfile:
+        for item in json.load(jsonfile):
+            yield item['name'], item.get('measurement_unit') or ''
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
 
 class Command(BaseCommand):
-    help = "Import Users from `../data/ingredients.csv`"
-
-    def handle(self, *args, **kwargs):
-        with open("data/ingredients.csv", encoding="utf-8") as csvfile:
-            csvreader = csv.reader(csvfile)
-            next(csvreader)
-            for row in csvreader:
-                Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1],
+    help = 'Загрузка ингредиентов из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='data/ingredients.csv',
+            help='Путь к файлу .csv (название,единица) или .json.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже в PostgreSQL.'
+        )
+
+    def insert_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch),
+            ignore_conflicts=True
+        )
+
+    def copy_batch(self, cursor, batch):
+        """Быстрая загрузка в PostgreSQL: COPY во временную таблицу."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        cursor.execute('TRUNCATE ingredient_import')
+        cursor.copy_expert(
+            'COPY ingredient_import (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (measurement_unit))',
+            buffer
+        )
+        cursor.execute(
+            f'INSERT INTO {Ingredient._meta.db_table} '
+            '(name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredient_import '
+            'ON CONFLICT DO NOTHING'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден')
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+        before = Ingredient.objects.count()
+        total = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            if use_copy:
+                cursor.execute(
+                    'CREATE TEMPORARY TABLE ingredient_import '
+                    '(name text, measurement_unit text) ON COMMIT DROP'
                 )
+            for batch in batches(reader(path), options['batch_size']):
+                if use_copy:
+                    self.copy_batch(cursor, batch)
+                else:
+                    self.insert_batch(batch)
+                total += len(batch)
+                self.stdout.write(f'Обработано строк: {total}')
+        invalidate_ingredient_index()
+        inserted = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {total - inserted}'
+        ))
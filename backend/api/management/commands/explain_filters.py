@@ -0,0 +1,93 @@
+import re
+from itertools import combinations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipes.models import Recipe, ShoppingListItem, Tag
+from recipes.shopping_list import calculate_shopping_lists
+from recipes.utils import RECIPE_VALIDATOR_FIELDS
+from recipes.views import RecipeViewSet
+from users.models import Follow, User
+
+URL = '/api/recipes/'
+BIG_TABLES = (
+    'recipes_recipe', 'recipes_recipe_tags', 'recipes_favorite',
+    'recipes_shoppingcart', 'recipes_recipeingredientrelation',
+    'recipes_shoppinglistitem', 'users_follow',
+)
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+class Command(BaseCommand):
+    help = ('Проверяет через EXPLAIN в PostgreSQL, что фильтры рецептов, '
+            'подписки и список покупок не читают большие таблицы целиком.')
+
+    def recipe_queries(self, user):
+        tag = Tag.objects.values_list('slug', flat=True).first()
+        filters = {
+            'tags': tag, 'author': user.pk,
+            'is_favorited': 1, 'is_in_shopping_cart': 1,
+        }
+        factory = APIRequestFactory()
+        for size in range(len(filters) + 1):
+            for names in combinations(filters, size):
+                request = factory.get(
+                    URL, {name: filters[name] for name in names}
+                )
+                force_authenticate(request, user)
+                view = RecipeViewSet(
+                    request=Request(request), format_kwarg=None,
+                    action='list', kwargs={}
+                )
+                view.request.user = user
+                queryset = view.filter_queryset(view.get_queryset())
+                yield (
+                    'рецепты ' + (', '.join(names) or 'без фильтров'),
+                    queryset.values(*RECIPE_VALIDATOR_FIELDS)[:6]
+                )
+
+    def queries(self, user):
+        yield from self.recipe_queries(user)
+        yield 'подписчики автора', Follow.objects.filter(author=user)
+        yield 'подписки', Follow.objects.filter(subscriber=user)
+        yield 'список покупок', ShoppingListItem.objects.filter(
+            user=user
+        ).values('ingredient__name', 'amount')
+        yield 'расчёт списка покупок', calculate_shopping_lists(
+            recipe__groceries__user=user
+        )
+        yield 'рецепты автора', Recipe.objects.filter(
+            author=user
+        ).order_by('-id')[:3]
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов доступна только в PostgreSQL')
+        user = User.objects.order_by('pk').first()
+        if user is None:
+            raise CommandError('Нет пользователей, выполните generate_data')
+        failures = 0
+        with transaction.atomic():
+            # На маленьких таблицах планировщик честно выбирает полный
+            # просмотр, поэтому запрещаем его и смотрим, есть ли индекс.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset in self.queries(user):
+                plan = queryset.explain()
+                scans = set(SEQ_SCAN.findall(plan)) & set(BIG_TABLES)
+                if scans:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: полный просмотр {", ".join(sorted(scans))}'
+                    ))
+                    self.stdout.write(plan)
+                else:
+                    self.stdout.write(f'{name}: OK')
+        if failures:
+            raise CommandError(f'Запросов без индекса: {failures}')
+        self.stdout.write(
+            self.style.SUCCESS('Все запросы используют индексы.')
+        )
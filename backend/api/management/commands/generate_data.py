@@ -0,0 +1,230 @@
+import random
+from itertools import accumulate
+
+from django.conf import settings as s
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from rest_framework.authtoken.models import Token
+
+from recipes.counters import repair_counters
+from recipes.models import (Favorite, Ingredient, Recipe,
+                            RecipeIngredientRelation, ShoppingCart, Tag)
+from recipes.pantry import invalidate_pantry_index
+from recipes.response_cache import invalidate_recipe_lists
+from recipes.search import update_search_vector
+from recipes.tags import invalidate_tag_slugs
+from users.models import Follow, User
+
+BATCH_SIZE = 5000
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+    ('Десерт', 'dessert', '#F4A6C0'),
+    ('Выпечка', 'baking', '#C49A6C'),
+    ('Постное', 'lenten', '#6CA0DC'),
+)
+DISHES = ('суп', 'салат', 'пирог', 'рагу', 'каша', 'запеканка', 'омлет',
+          'паста', 'плов', 'оладьи', 'котлеты', 'торт')
+ADJECTIVES = ('домашний', 'быстрый', 'бабушкин', 'летний', 'пряный',
+              'сытный', 'лёгкий', 'праздничный', 'деревенский', 'острый')
+WORDS = ('нарезать', 'смешать', 'обжарить', 'довести', 'до', 'кипения',
+         'добавить', 'посолить', 'запекать', 'минут', 'подавать', 'с',
+         'зеленью', 'тесто', 'соус', 'на', 'среднем', 'огне', 'остудить')
+
+
+def zipf_weights(count, exponent=1.0):
+    """Накопленные веса распределения Ципфа: первые элементы популярнее."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетический набор данных: пользователей, рецепты, '
+            'подписки, избранное и корзины. Всё пишется пакетными вставками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок на пользователя.')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Среднее число избранных на пользователя.')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Среднее число рецептов в корзине.')
+        parser.add_argument('--password', default='foodgram')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def new_ids(self, model, before):
+        """bulk_create не везде возвращает id, поэтому дочитываем их."""
+        return list(model.objects.filter(pk__gt=before or 0).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def create_users(self, count, password):
+        before = User.objects.aggregate(last=Max('pk'))['last'] or 0
+        password = make_password(password)
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f'user{number}@foodgram.local',
+                    username=f'user{number}',
+                    first_name='Пользователь',
+                    last_name=str(number),
+                    password=password,
+                ) for number in range(before + 1, before + count + 1)
+            ),
+            batch_size=self.batch_size
+        )
+        user_ids = self.new_ids(User, before)
+        Token.objects.bulk_create(
+            (Token(key=Token.generate_key(), user_id=user_id)
+             for user_id in user_ids),
+            batch_size=self.batch_size
+        )
+        return user_ids
+
+    def get_tags(self):
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        if tag_ids:
+            return tag_ids
+        Tag.objects.bulk_create(
+            Tag(name=name, slug=slug, color=color)
+            for name, slug, color in TAGS
+        )
+        invalidate_tag_slugs()
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def create_recipes(self, count, author_ids):
+        before = Recipe.objects.aggregate(last=Max('pk'))['last']
+        authors = author_ids[:]
+        self.random.shuffle(authors)
+        author_weights = zipf_weights(len(authors))
+        choice = self.random.choice
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=self.random.choices(
+                        authors, cum_weights=author_weights
+                    )[0],
+                    name=f'{choice(ADJECTIVES).capitalize()} '
+                         f'{choice(DISHES)}',
+                    text=' '.join(self.random.choices(
+                        WORDS, k=self.random.randint(10, 60)
+                    )),
+                    cooking_time=self.random.randint(
+                        s.MIN_COOKING_TIME, 180
+                    ),
+                ) for _ in range(count)
+            ),
+            batch_size=self.batch_size
+        )
+        return self.new_ids(Recipe, before)
+
+    def link_recipes(self, recipe_ids, tag_ids, ingredient_ids):
+        """Теги и ингредиенты рецептов с неравномерной популярностью."""
+        self.random.shuffle(ingredient_ids)
+        ingredient_weights = zipf_weights(len(ingredient_ids), 0.8)
+        tag_weights = zipf_weights(len(tag_ids), 0.5)
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in set(self.random.choices(
+                    tag_ids, cum_weights=tag_weights,
+                    k=self.random.randint(1, 3)
+                ))
+            ),
+            batch_size=self.batch_size, ignore_conflicts=True
+        )
+        RecipeIngredientRelation.objects.bulk_create(
+            (
+                RecipeIngredientRelation(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(
+                        s.MIN_INGREDIENT_AMOUNT, 500
+                    ),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in set(self.random.choices(
+                    ingredient_ids, cum_weights=ingredient_weights,
+                    k=round(self.random.triangular(2, 15, 6))
+                ))
+            ),
+            batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    def pairs(self, user_ids, targets, average):
+        """Пары пользователь-объект, популярные объекты встречаются чаще."""
+        if average <= 0:
+            return
+        targets = targets[:]
+        self.random.shuffle(targets)
+        weights = zipf_weights(len(targets))
+        for user_id in user_ids:
+            count = min(
+                round(self.random.expovariate(1 / average)), len(targets)
+            )
+            for target in set(self.random.choices(
+                targets, cum_weights=weights, k=count
+            )):
+                yield user_id, target
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Нет ингредиентов, сначала выполните csv_importer'
+            )
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            user_ids = self.create_users(
+                options['users'], options['password']
+            )
+            self.stdout.write(f'Пользователей: {len(user_ids)}')
+            recipe_ids = self.create_recipes(options['recipes'], user_ids)
+            self.link_recipes(recipe_ids, self.get_tags(), ingredient_ids)
+            self.stdout.write(f'Рецептов: {len(recipe_ids)}')
+            Follow.objects.bulk_create(
+                (
+                    Follow(subscriber_id=subscriber, author_id=author)
+                    for subscriber, author in self.pairs(
+                        user_ids, user_ids, options['follows']
+                    ) if subscriber != author
+                ),
+                batch_size=self.batch_size, ignore_conflicts=True
+            )
+            for model, average in ((Favorite, options['favorites']),
+                                   (ShoppingCart, options['carts'])):
+                model.objects.bulk_create(
+                    (
+                        model(user_id=user_id, recipe_id=recipe_id)
+                        for user_id, recipe_id in self.pairs(
+                            user_ids, recipe_ids, average
+                        )
+                    ),
+                    batch_size=self.batch_size, ignore_conflicts=True
+                )
+            self.stdout.write('Подписки, избранное и корзины созданы.')
+            # Пакетные вставки обходят сигналы: пересчитываем производные
+            # данные целиком.
+            repair_counters()
+            update_search_vector(
+                Recipe.objects.filter(pk__gte=recipe_ids[0])
+            )
+            invalidate_recipe_lists()
+            invalidate_pantry_index()
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        call_command('rebuild_feed', stdout=self.stdout)
+        call_command('rebuild_similar_index', stdout=self.stdout)
+        token = Token.objects.filter(user_id=user_ids[0]).first()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Токен пользователя {user_ids[0]}: {token.key}'
+        ))
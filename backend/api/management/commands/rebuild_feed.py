@@ -0,0 +1,53 @@
+from django.conf import settings as s
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import TimelineEntry
+from recipes.utils import recipes_by_author
+from users.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает ленты подписок: отмечает авторов, чьи рецепты '
+            'читаются при запросе, и заполняет ленты последними '
+            'рецептами остальных.')
+
+    def fill(self, authors):
+        recipes = recipes_by_author(authors, s.FEED_BACKFILL_SIZE)
+        return TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    subscriber_id=subscriber_id, author_id=author_id,
+                    recipe_id=recipe.pk
+                )
+                for subscriber_id, author_id in Follow.objects.filter(
+                    author__in=authors
+                ).values_list('subscriber_id', 'author_id').iterator()
+                for recipe in recipes[author_id]
+            ),
+            batch_size=s.BULK_CREATE_BATCH_SIZE
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        TimelineEntry.objects.all().delete()
+        User.objects.filter(feed_on_read=True).update(feed_on_read=False)
+        followers = dict(User.objects.annotate(
+            followers=Count('followed')
+        ).filter(followers__gt=0).values_list('pk', 'followers'))
+        popular = [
+            author for author, total in followers.items()
+            if total > s.FEED_FANOUT_LIMIT
+        ]
+        User.objects.filter(pk__in=popular).update(feed_on_read=True)
+        authors = [author for author in followers if author not in popular]
+        created = 0
+        for start in range(0, len(authors), s.BULK_CREATE_BATCH_SIZE):
+            created += len(self.fill(
+                authors[start:start + s.BULK_CREATE_BATCH_SIZE]
+            ))
+        self.stdout.write(
+            f'Записей в лентах: {created}, авторов с чтением '
+            f'при запросе: {len(popular)}.'
+        )
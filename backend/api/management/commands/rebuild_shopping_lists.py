@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+from recipes.shopping_list import calculate_shopping_lists
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает списки покупок пользователей и сверяет их '
+            'с расчётом по корзинам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check-only', action='store_true',
+            help='Только сверить агрегат, ничего не меняя.'
+        )
+
+    def rebuild(self):
+        ShoppingListItem.objects.all().delete()
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(
+                    user_id=row['recipe__groceries__user'],
+                    ingredient_id=row['ingredient'],
+                    amount=row['total'],
+                ) for row in calculate_shopping_lists().iterator()
+            ),
+            batch_size=BATCH_SIZE
+        )
+
+    def compare(self):
+        expected = {
+            (row['recipe__groceries__user'], row['ingredient']): row['total']
+            for row in calculate_shopping_lists().iterator()
+        }
+        items = ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'amount'
+        )
+        actual = {
+            (user, ingredient): amount
+            for user, ingredient, amount in items.iterator()
+        }
+        return [
+            (user, ingredient, expected.get((user, ingredient)),
+             actual.get((user, ingredient)))
+            for user, ingredient in expected.keys() | actual.keys()
+            if expected.get((user, ingredient)) != actual.get(
+                (user, ingredient)
+            )
+        ]
+
+    def handle(self, *args, **options):
+        if not options['check_only']:
+            with transaction.atomic():
+                self.rebuild()
+            self.stdout.write('Списки покупок пересобраны.')
+        mismatches = self.compare()
+        for user, ingredient, expected, actual in mismatches:
+            self.stdout.write(
+                f'Пользователь {user}, ингредиент {ingredient}: '
+                f'ожидалось {expected}, в агрегате {actual}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Агрегат совпадает с корзинами.'))
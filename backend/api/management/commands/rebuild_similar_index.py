@@ -0,0 +1,67 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+
+from recipes.models import Recipe
+from recipes.similar import recipe_signatures, store_signatures
+
+
+def id_range(start, stop):
+    return Recipe.objects.filter(pk__gte=start, pk__lt=stop)
+
+
+def range_signatures(start, stop):
+    """Подписи рецептов с id из [start, stop) в отдельном процессе."""
+    return start, stop, recipe_signatures(id_range(start, stop))
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает MinHash-индекс похожих рецептов. Подписи '
+            'диапазонов id считаются параллельно, записывает их основной '
+            'процесс.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        bounds = Recipe.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            self.stdout.write('Рецептов нет.')
+            return
+        ranges = [
+            (start, start + options['chunk_size'])
+            for start in range(
+                bounds['first'], bounds['last'] + 1, options['chunk_size']
+            )
+        ]
+        if options['processes'] > 1:
+            # Соединения с базой не должны переходить в дочерние процессы.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                options['processes'], initializer=django.setup
+            ) as executor:
+                total = self.store(
+                    executor.map(range_signatures, *zip(*ranges)),
+                    len(ranges)
+                )
+        else:
+            total = self.store(
+                (range_signatures(*bounds) for bounds in ranges), len(ranges)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {total}.'
+        ))
+
+    def store(self, results, count):
+        total = 0
+        for number, (start, stop, signatures) in enumerate(results, 1):
+            store_signatures(id_range(start, stop), signatures)
+            total += len(signatures)
+            self.stdout.write(
+                f'Диапазон {number}/{count}: {len(signatures)}'
+            )
+        return total
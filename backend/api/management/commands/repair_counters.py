@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import repair_counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного, корзин и рецептов '
+            'по исходным таблицам.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes, users = repair_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}'
+        ))
@@ -0,0 +1,162 @@
+import math
+import re
+import string
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlsplit, urlunsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings as s
+from django.core.management.base import BaseCommand, CommandError
+
+VARIABLE = re.compile(r'{{\s*(\w+)\s*}}')
+DEFINITION = re.compile(r'^@(\w+)\s*=\s*(.*)$')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Процентиль методом ближайшего ранга по отсортированному списку."""
+    return values[max(math.ceil(rank / 100 * len(values)) - 1, 0)]
+
+
+def substitute(text, variables):
+    return VARIABLE.sub(
+        lambda match: variables.get(match[1], match[0]), text
+    )
+
+
+def parse_http_file(text, variables):
+    """Разбирает файл формата requests.http на список сценариев.
+
+    Запросы разделяются строками `###`, переменные задаются строками
+    `@name = value` и подставляются на место `{{name}}`.
+    """
+    scenarios = []
+    for block in re.split(r'^###.*$', text, flags=re.MULTILINE):
+        lines = []
+        for line in block.strip().splitlines():
+            definition = DEFINITION.match(line)
+            if definition:
+                variables.setdefault(*definition.groups())
+            elif not line.startswith(('#', '//')):
+                lines.append(line)
+        if not lines:
+            continue
+        head, *rest = lines
+        method, url, *_ = head.split()
+        headers = {}
+        while rest and rest[0].strip():
+            name, _, value = rest.pop(0).partition(':')
+            headers[name.strip()] = value.strip()
+        body = '\n'.join(rest).strip()
+        scenarios.append((method.upper(), url, headers, body))
+    return [
+        (method, substitute(url, variables),
+         {name: substitute(value, variables)
+          for name, value in headers.items()},
+         substitute(body, variables))
+        for method, url, headers, body in scenarios
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон сценариев из файла формата requests.http '
+            'против запущенного сервера: p50/p95/p99 и число SQL-запросов '
+            'по каждому эндпоинту. Запросы считаются, если сервер запущен '
+            'с QUERY_COUNT_HEADER=True.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=s.BASE_DIR.parent / 'requests.http'
+        )
+        parser.add_argument(
+            '--base-url', help='Заменяет схему и хост в адресах сценариев.'
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Сколько раз выполнить каждый сценарий.')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument(
+            '--var', action='append', default=[], metavar='NAME=VALUE',
+            help='Переменная для подстановки вместо {{NAME}}.'
+        )
+
+    def rebase(self, url, base_url):
+        url = quote(url, safe=string.punctuation)
+        if not base_url:
+            return url
+        base = urlsplit(base_url)
+        return urlunsplit(urlsplit(url)._replace(
+            scheme=base.scheme, netloc=base.netloc
+        ))
+
+    def send(self, scenario):
+        method, url, headers, body = scenario
+        request = Request(
+            url, data=body.encode() or None, headers=headers, method=method
+        )
+        start = time.perf_counter()
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status, response_headers = response.status, response.headers
+        except HTTPError as error:
+            status, response_headers = error.code, error.headers
+        except URLError:
+            status, response_headers = 0, {}
+        elapsed = (time.perf_counter() - start) * 1000
+        return scenario, status, elapsed, response_headers.get('X-Query-Count')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8') as file:
+                text = file.read()
+        except OSError as error:
+            raise CommandError(error)
+        variables = dict(
+            variable.partition('=')[::2] for variable in options['var']
+        )
+        scenarios = [
+            (method, self.rebase(url, options['base_url']), headers, body)
+            for method, url, headers, body in parse_http_file(text, variables)
+        ]
+        if not scenarios:
+            raise CommandError('В файле нет запросов')
+        self.timeout = options['timeout']
+        timings = defaultdict(list)
+        queries = defaultdict(list)
+        errors = defaultdict(int)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = executor.map(
+                self.send, scenarios * options['repeat']
+            )
+            for (method, url, *_), status, elapsed, count in results:
+                endpoint = f'{method} {urlsplit(url).path}'
+                timings[endpoint].append(elapsed)
+                if count is not None:
+                    queries[endpoint].append(int(count))
+                if not 200 <= status < 400:
+                    errors[endpoint] += 1
+        total = time.perf_counter() - start
+        for endpoint, values in timings.items():
+            values.sort()
+            latency = ', '.join(
+                f'p{rank} {percentile(values, rank):8.2f} мс'
+                for rank in PERCENTILES
+            )
+            counts = queries[endpoint]
+            average = (f'{sum(counts) / len(counts):5.1f}'
+                       if counts else '    -')
+            self.stdout.write(
+                f'{endpoint:<40} n={len(values):<5} '
+                f'ошибок={errors[endpoint]:<4} {latency}, '
+                f'запросов к БД {average}'
+            )
+        requests = sum(map(len, timings.values()))
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего {requests} запросов за {total:.1f} с '
+            f'({requests / total:.1f} в секунду)'
+        ))
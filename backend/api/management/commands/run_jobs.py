@@ -0,0 +1,37 @@
+from multiprocessing import Process
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import work
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркеры фоновых задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Завершиться, когда очередь опустеет.'
+        )
+
+    def handle(self, *args, **options):
+        once = options['once']
+        if options['workers'] == 1:
+            work(once)
+            return
+        # Процессы-потомки должны открыть свои соединения с базой.
+        connections.close_all()
+        workers = [
+            Process(target=work, args=(once,))
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
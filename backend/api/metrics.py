@@ -0,0 +1,238 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from uuid import uuid4
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from django.conf import settings as s
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+METRICS = {
+    'foodgram_http_requests_total': (
+        'counter', 'Число запросов по маршруту и коду ответа.', None
+    ),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.', LATENCY_BUCKETS
+    ),
+    'foodgram_http_response_size_bytes': (
+        'histogram', 'Размер тела ответа.', SIZE_BUCKETS
+    ),
+    'foodgram_db_queries_total': (
+        'counter', 'Число SQL-запросов.', None
+    ),
+    'foodgram_db_query_duration_seconds_total': (
+        'counter', 'Суммарное время SQL-запросов.', None
+    ),
+}
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+TOTALS_FILE = 'totals.json'
+LOCK_FILE = '.lock'
+
+
+def format_labels(labels):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    )
+
+
+def process_token(pid):
+    """pid и время запуска процесса из /proc или None.
+
+    При переиспользовании pid время запуска другое, поэтому по метке
+    понятно, жив ли процесс, который записал файл.
+    """
+    try:
+        stat = Path(f'/proc/{pid}/stat').read_text()
+    except OSError:
+        return None
+    # Имя программы в скобках может содержать пробелы; после него
+    # starttime - двадцатое поле.
+    return f'{pid}-{stat.rsplit(")", 1)[1].split()[19]}'
+
+
+def read_samples(path):
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def write_samples(path, data):
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(data), encoding='utf-8')
+    os.replace(temporary, path)
+
+
+class MetricsStore:
+    """Метрики процесса с периодическим сбросом в общий каталог.
+
+    Каждый воркер gunicorn пишет свой файл `<pid>-<метка>.json` из
+    фонового потока, при чтении файлы всех процессов суммируются. Метка -
+    время запуска процесса, поэтому новый процесс с тем же pid не
+    затирает файл завершившегося. Файлы завершившихся процессов при
+    чтении переносятся в totals.json, так счётчики не убывают при
+    перезапуске воркеров, а каталог не растёт.
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.reset()
+        atexit.register(self.flush)
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.token = process_token(self.pid) or f'{self.pid}-{uuid4().hex}'
+        self.values = defaultdict(float)
+        self.dirty = False
+        self.flusher = None
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Процесс унаследовал хранилище при fork.
+                self.reset()
+            if self.flusher is None:
+                self.flusher = threading.Thread(
+                    target=self.flush_periodically, daemon=True
+                )
+                self.flusher.start()
+            self.values[name, tuple(sorted(labels.items()))] += value
+            self.dirty = True
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        for bound in buckets:
+            if value <= bound:
+                self.inc(f'{name}_bucket', {**labels, 'le': bound})
+        self.inc(f'{name}_bucket', {**labels, 'le': '+Inf'})
+        self.inc(f'{name}_sum', labels, value)
+        self.inc(f'{name}_count', labels)
+
+    def flush(self):
+        with self.lock:
+            if self.pid != os.getpid() or not self.dirty:
+                return
+            data = [
+                [name, labels, value]
+                for (name, labels), value in self.values.items()
+            ]
+            self.dirty = False
+            self.directory.mkdir(parents=True, exist_ok=True)
+            write_samples(self.directory / f'{self.token}.json', data)
+
+    def collect(self):
+        """Суммируем метрики всех процессов.
+
+        Чтение и перенос файлов завершившихся процессов идут под
+        блокировкой файла, чтобы два процесса не перенесли один файл
+        дважды. Без fcntl или /proc живые процессы не отличить от
+        завершившихся, тогда файлы только суммируются.
+        """
+        self.flush()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if fcntl is None or process_token(self.pid) is None:
+            return self.sum_files(merge=False)
+        with open(self.directory / LOCK_FILE, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return self.sum_files(merge=True)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def sum_files(self, merge):
+        """Итоги завершившихся процессов плюс файлы живых.
+
+        В totals.json вместе с суммой записываются метки переносимых
+        файлов: если процесс упадёт до их удаления, файлы не учтутся
+        дважды и удалятся при следующем чтении.
+        """
+        totals_path = self.directory / TOTALS_FILE
+        stored = read_samples(totals_path) or {'merged': [], 'values': []}
+        merged = set(stored['merged'])
+        totals = defaultdict(float)
+        for name, labels, value in stored['values']:
+            totals[name, tuple(map(tuple, labels))] += value
+        live = defaultdict(float)
+        finished = []
+        for path in self.directory.glob('*.json'):
+            token = path.stem
+            if path.name == TOTALS_FILE:
+                continue
+            if token in merged:
+                finished.append(path)
+                continue
+            data = read_samples(path)
+            if data is None:
+                continue
+            dead = merge and process_token(token.split('-', 1)[0]) != token
+            for name, labels, value in data:
+                (totals if dead else live)[
+                    name, tuple(map(tuple, labels))
+                ] += value
+            if dead:
+                finished.append(path)
+        if finished:
+            values = [
+                [name, labels, value]
+                for (name, labels), value in totals.items()
+            ]
+            write_samples(totals_path, {
+                'merged': sorted(path.stem for path in finished),
+                'values': values,
+            })
+            for path in finished:
+                path.unlink()
+            write_samples(totals_path, {'merged': [], 'values': values})
+        for key, value in live.items():
+            totals[key] += value
+        return totals
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        samples = defaultdict(list)
+        for (name, labels), value in self.collect().items():
+            family = next(
+                (metric for metric in METRICS if name.startswith(metric)),
+                name
+            )
+            samples[family].append((name, labels, value))
+        lines = []
+        for family, (kind, description, _) in METRICS.items():
+            lines.append(f'# HELP {family} {description}')
+            lines.append(f'# TYPE {family} {kind}')
+            for name, labels, value in sorted(
+                samples[family], key=self.sort_key
+            ):
+                lines.append(f'{name}{{{format_labels(labels)}}} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def sort_key(sample):
+        name, labels, _ = sample
+        labels = dict(labels)
+        bound = labels.pop('le', None)
+        return (
+            sorted(labels.items()), name,
+            float('inf') if bound in (None, '+Inf') else float(bound)
+        )
+
+
+metrics = MetricsStore(s.METRICS_DIR, s.METRICS_FLUSH_INTERVAL)
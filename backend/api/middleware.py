@@ -0,0 +1,76 @@
+import time
+
+from django.conf import settings as s
+from django.db import connection
+
+from api.metrics import metrics
+
+
+class MetricsMiddleware:
+    """Собирает по имени маршрута DRF время ответа, размер ответа,
+    число и время SQL-запросов.
+
+    При включённой настройке QUERY_COUNT_HEADER число SQL-запросов
+    дополнительно отдаётся в заголовке X-Query-Count, его читает
+    команда replay_requests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+        query_time = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries, query_time
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries += 1
+                query_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count):
+            response = self.get_response(request)
+        if s.QUERY_COUNT_HEADER:
+            response['X-Query-Count'] = queries
+        match = request.resolver_match
+        route = match.url_name if match and match.url_name else 'unknown'
+
+        def record(size):
+            labels = {'route': route}
+            metrics.inc(
+                'foodgram_http_requests_total',
+                {**labels, 'status': response.status_code}
+            )
+            metrics.observe(
+                'foodgram_http_request_duration_seconds', labels,
+                time.perf_counter() - start
+            )
+            metrics.observe('foodgram_http_response_size_bytes', labels, size)
+            metrics.inc('foodgram_db_queries_total', labels, queries)
+            metrics.inc(
+                'foodgram_db_query_duration_seconds_total', labels, query_time
+            )
+
+        if response.streaming:
+            response.streaming_content = self.measure(
+                response.streaming_content, count, record
+            )
+        else:
+            record(len(response.content))
+        return response
+
+    @staticmethod
+    def measure(content, count, record):
+        """Потоковый ответ учитываем, когда он отдан целиком."""
+        size = 0
+        try:
+            with connection.execute_wrapper(count):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            record(size)
@@ -1,6 +1,90 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+    def get_state(self):
+        """Всё, от чего зависит обёртка страницы в ответе."""
+        return self.page.paginator.count
+
+
+class KeysetPagination(CursorPagination):
+    """Пагинация по курсору: без COUNT(*) и OFFSET."""
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+    def get_state(self):
+        return self.get_next_link(), self.get_previous_link()
+
+
+class LimitPageNumberOrCursorPagination(LimitPageNumberPagination):
+    """Постраничная пагинация, а при наличии параметра cursor - по курсору.
+
+    Первую страницу в режиме курсора запрашивают с пустым ?cursor=.
+    Курсор идёт по убыванию id, поэтому при параметрах из
+    ranked_query_params, которые задают свой порядок (релевантность
+    поиска), параметр cursor игнорируется и страницы нумеруются.
+    """
+    cursor_query_param = 'cursor'
+    ranked_query_params = ('search',)
+    keyset = None
+
+    def use_cursor(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params and not any(
+            params.get(param) for param in self.ranked_query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_state(self):
+        if self.keyset is not None:
+            return self.keyset.get_state()
+        return super().get_state()
+
+
+class FeedPagination(KeysetPagination):
+    """Курсор по убыванию id для страниц, собранных не одним запросом.
+
+    fetch(before, limit) возвращает до limit id меньше before, по
+    убыванию. Лента читается только вперёд.
+    """
+
+    def paginate_ids(self, fetch, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        try:
+            before = int(cursor.position) if cursor else None
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        ids = fetch(before, self.page_size + 1)
+        self.has_next = len(ids) > self.page_size
+        self.page = ids[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=str(self.page[-1])
+        ))
+
+    def get_previous_link(self):
+        return None
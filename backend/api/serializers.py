@@ -3,12 +3,20 @@ import base64
 from django.core.files.base import ContentFile
 from django.conf import settings as s
 from django.db.transaction import atomic
+from django.urls import reverse
 from rest_framework import serializers, exceptions, status
 from rest_framework.validators import UniqueTogetherValidator
 
+from jobs.files import job_file
+from jobs.models import Job
 from users.models import User, Follow
+from users.utils import get_followed_authors
 from recipes.models import (Tag, Ingredient, Recipe, Favorite,
-                            RecipeIngredientRelation, ShoppingCart)
+                            RecipeIngredientRelation, ShoppingCart,
+                            ShoppingListItem)
+from recipes.images import rendition_urls
+from recipes.shopping_list import recipe_changed_in_carts
+from recipes.utils import sync_recipe_relations
 
 
 MIN_COOKING_TIME_ERROR = f'Минимальное время готовки - {s.MIN_COOKING_TIME}'
@@ -18,6 +26,8 @@ MAX_AMOUNT_ERROR = f'Максимальное количество - {s.MAX_INGR
 UNIQUE_INGREDIENT_ERROR = 'Ингредиенты в рецепте не должны повторяться.'
 NO_TAG_ERROR = 'Требуется добавить теги к рецепту.'
 UNIQUE_TAG_ERROR = 'Теги к рецепту должны быть уникальными.'
+NO_IMAGE_ERROR = 'Для нового рецепта нужна картинка.'
+BULK_LIMIT_ERROR = f'Не больше {s.BULK_RECIPES_LIMIT} рецептов за раз.'
 SELF_FOLLOW_ERROR = 'Нельзя подписаться на себя.'
 EXISTING_FOLLOW_ERROR = 'Вы уже подписаны на этого автора.'
 
@@ -32,14 +42,32 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
+class RenditionsField(serializers.ReadOnlyField):
+    """Адреса уменьшенных копий картинки рецепта."""
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        urls = rendition_urls(recipe)
+        request = self.context.get('request')
+        if urls is None or request is None:
+            return urls
+        return {
+            rendition: request.build_absolute_uri(url)
+            for rendition, url in urls.items()
+        }
+
+
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Recipe.
     Определён укороченный набор полей для некоторых эндпоинтов."""
     image = Base64ImageField()
+    renditions = RenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'renditions', 'cooking_time')
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -60,10 +88,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Проверяем подписан ли текущий пользователь на автора."""
-        user = self.context.get('request').user.id
-        if Follow.objects.filter(subscriber=user, author=obj).exists():
-            return True
-        return False
+        return obj.id in get_followed_authors(self.context.get('request'))
 
 
 class UserCreateSerializer(UserSerializer):
@@ -111,15 +136,9 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         read_only=True,
         source='ingredient'
     )
-    name = serializers.SlugRelatedField(
-        source='ingredient',
-        read_only=True,
-        slug_field='name'
-    )
-    measurement_unit = serializers.SlugRelatedField(
-        source='ingredient',
-        read_only=True,
-        slug_field='measurement_unit'
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
     )
 
     class Meta:
@@ -127,6 +146,19 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Сериализатор позиции списка покупок."""
+    id = serializers.ReadOnlyField(source='ingredient_id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор рецептов."""
     is_favorited = serializers.SerializerMethodField(read_only=True)
@@ -134,6 +166,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
     image = Base64ImageField()
+    renditions = RenditionsField()
     ingredients = IngredientInRecipeSerializer(
         read_only=True,
         many=True,
@@ -151,12 +184,15 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'renditions',
             'text',
             'cooking_time',
         )
 
     def get_is_favorited(self, obj):
         """проверяем наличие рецепта в избранном."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -164,6 +200,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Проверям наличие рецепта в корзине."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -254,18 +292,97 @@ class RecipeEditSerializer(serializers.ModelSerializer):
         #        validated_data['image']
         #    )
 
-        # Обновляем теги и ингредиенты
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.tags_and_ingredients_set(recipe=instance,
-                                      tags=tags,
-                                      ingredients=ingredients)
+        # Обновляем теги и ингредиенты: пишем только изменившиеся строки
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        old_amounts = sync_recipe_relations({instance.pk: (
+            None if tags is None else [tag.pk for tag in tags],
+            None if ingredients is None else {
+                item['id'].pk: item['amount'] for item in ingredients
+            },
+        )})
+        if ingredients is not None:
+            recipe_changed_in_carts(instance, old_amounts[instance.pk])
         return super().update(instance, validated_data)
 
 
+class BulkIngredientSerializer(serializers.Serializer):
+    """Ингредиент рецепта в пакете: id проверяются сразу для всего пакета."""
+    id = serializers.IntegerField()
+    amount = serializers.IntegerField(
+        min_value=s.MIN_INGREDIENT_AMOUNT,
+        max_value=s.MAX_INGREDIENT_AMOUNT,
+        error_messages={'min_value': MIN_AMOUNT_ERROR,
+                        'max_value': MAX_AMOUNT_ERROR}
+    )
+
+
+class RecipeBulkItemSerializer(serializers.Serializer):
+    """Рецепт в пакетной загрузке, с id - изменение существующего.
+
+    Проверяет всё, кроме ссылок на теги, ингредиенты и рецепты:
+    их существование проверяется для всего пакета запросами IN.
+    """
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField(max_length=s.MAX_LENGTH)
+    text = serializers.CharField()
+    cooking_time = serializers.IntegerField(
+        min_value=s.MIN_COOKING_TIME,
+        max_value=s.MAX_COOKING_TIME,
+        error_messages={'min_value': MIN_COOKING_TIME_ERROR,
+                        'max_value': MAX_COOKING_TIME_ERROR}
+    )
+    image = Base64ImageField(required=False)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False,
+        error_messages={'empty': NO_TAG_ERROR}
+    )
+    ingredients = BulkIngredientSerializer(many=True, allow_empty=False)
+
+    def validate_tags(self, value):
+        if len(set(value)) != len(value):
+            raise exceptions.ValidationError(UNIQUE_TAG_ERROR)
+        return value
+
+    def validate_ingredients(self, value):
+        if len({item['id'] for item in value}) != len(value):
+            raise exceptions.ValidationError(UNIQUE_INGREDIENT_ERROR)
+        return value
+
+    def validate(self, data):
+        if 'id' not in data and 'image' not in data:
+            raise exceptions.ValidationError(
+                {'image': NO_IMAGE_ERROR}
+            )
+        return data
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного избранного и корзины."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False,
+        max_length=s.BULK_RECIPES_LIMIT,
+        error_messages={'max_length': BULK_LIMIT_ERROR}
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class PantrySerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся продуктам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False,
+        max_length=s.PANTRY_MAX_INGREDIENTS
+    )
+    max_missing = serializers.IntegerField(
+        min_value=0, max_value=s.PANTRY_MAX_MISSING, default=0
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=s.PANTRY_MAX_LIMIT, default=s.PANTRY_LIMIT
+    )
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор добавления рецепта в избранное."""
     class Meta:
@@ -297,7 +414,7 @@ class ShoppingCartAddSerializer(serializers.ModelSerializer):
 class FollowSerializer(serializers.ModelSerializer):
     """Сериализатор подписок."""
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -326,19 +443,37 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def get_recipes(self, obj):
         """Получаем рецепты пользователя."""
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.id, ())
+        else:
+            limit = self.context.get('request').GET.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit:
+                recipes = recipes[:int(limit)]
         serializer = ShortRecipeSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        """Получаем количество рецептов."""
-        return obj.recipes.all().count()
-
     def get_is_subscribed(self, obj):
         """Проверяем подписан ли текущий пользователь на автора."""
-        user = self.context.get('request').user
-        return Follow.objects.filter(subscriber=user, author=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in get_followed_authors(self.context.get('request'))
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Сериализатор статуса фоновой задачи."""
+    class Meta:
+        model = Job
+        fields = ('id', 'name', 'status', 'attempts', 'result', 'error',
+                  'created_at', 'updated_at')
+
+    def to_representation(self, job):
+        """К готовому файлу задачи добавляем ссылку на его скачивание."""
+        data = super().to_representation(job)
+        if job_file(job) is not None:
+            data['result'] = {
+                **data['result'],
+                'url': reverse('jobs-download', args=(job.pk,)),
+            }
+        return data
@@ -2,6 +2,8 @@ from django.urls import include, path
 
 from rest_framework.routers import DefaultRouter
 
+from api.views import metrics_view
+from jobs.views import JobViewSet
 from recipes.views import (TagViewSet, IngredientViewSet, RecipeViewSet)
 from users.views import CustomUserViewSet
 
@@ -10,8 +12,10 @@ router.register(r'users', CustomUserViewSet, basename='users')
 router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
+router.register(r'jobs', JobViewSet, basename='jobs')
 
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
     path('', include(router.urls)),
     path('', include('rest_framework.urls')),
     path('', include('djoser.urls')),
@@ -0,0 +1,27 @@
+from secrets import compare_digest
+
+from django.conf import settings as s
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from api.metrics import CONTENT_TYPE, metrics
+
+
+def metrics_allowed(request):
+    """Адрес из METRICS_ALLOWED_IPS или токен METRICS_TOKEN."""
+    if request.META.get('REMOTE_ADDR') in s.METRICS_ALLOWED_IPS:
+        return True
+    scheme, _, token = request.META.get(
+        'HTTP_AUTHORIZATION', ''
+    ).partition(' ')
+    return bool(s.METRICS_TOKEN) and scheme == 'Bearer' and compare_digest(
+        token, s.METRICS_TOKEN
+    )
+
+
+@require_GET
+def metrics_view(request):
+    """Метрики всех воркеров в формате Prometheus."""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
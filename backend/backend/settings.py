@@ -18,8 +18,10 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'api',
+    'jobs',
     'recipes',
     'users',
 
@@ -39,6 +41,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -75,6 +78,20 @@ DATABASES = {
 }
 
 
+# Кэш общий для всех воркеров gunicorn на одном хосте. Фоновые задачи
+# тоже сбрасывают кэш, поэтому в docker-compose каталог CACHE_LOCATION -
+# общий том backend и worker.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+    }
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -146,7 +163,56 @@ MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 1000
 MIN_INGREDIENT_AMOUNT = 1
 MAX_INGREDIENT_AMOUNT = 1000
-FILENAME = 'shopping_cart.txt'
+FILENAME = 'shopping_cart'
+SHOPPING_LIST_FONT = BASE_DIR / 'fonts' / 'Verdana.ttf'
+INGREDIENT_SEARCH_LIMIT = 50
+RESPONSE_CACHE_TIMEOUT = 600
+TAG_SLUGS_CACHE_TIMEOUT = 60 * 60
+BULK_RECIPES_LIMIT = 1000
+BULK_CREATE_BATCH_SIZE = 500
+# Лента подписок: рецепты авторов с большим числом подписчиков
+# не раскладываются по лентам, а читаются при запросе.
+FEED_FANOUT_LIMIT = 5000
+FEED_BACKFILL_SIZE = 50
+# Похожие рецепты: длина MinHash-подписи и число значений в полосе LSH.
+# После изменения нужно выполнить rebuild_similar_index.
+SIMILAR_MINHASH_SIZE = 64
+SIMILAR_BAND_SIZE = 4
+SIMILAR_CANDIDATES = 200
+SIMILAR_LIMIT = 6
+# Поиск по продуктам: ограничения запроса; журнал изменений - в секундах.
+PANTRY_MAX_INGREDIENTS = 100
+PANTRY_MAX_MISSING = 5
+PANTRY_LIMIT = 6
+PANTRY_MAX_LIMIT = 50
+PANTRY_JOURNAL_LAG = 60
+PANTRY_JOURNAL_RETENTION = 24 * 60 * 60
+SEARCH_CONFIG = 'russian'
+# Варианты картинки рецепта: название и максимальный размер.
+IMAGE_RENDITIONS = {
+    'thumbnail': (480, 480),
+    'detail': (1280, 1280),
+}
+IMAGE_RENDITION_QUALITY = 85
+# Фоновые задачи: число попыток, задержки и блокировка - в секундах.
+JOB_STATUS_LENGTH = 16
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_LOCK_TIMEOUT = 300
+JOB_POLL_INTERVAL = 1
+# Файлы, которые задачи готовят для пользователя: не раздаются через
+# /media/, отдаются только владельцу задачи и удаляются через JOB_FILE_TTL.
+JOB_FILES_ROOT = os.path.join(BASE_DIR, 'job_files')
+JOB_FILE_TTL = 24 * 60 * 60
+METRICS_DIR = os.getenv('METRICS_DIR', default='/tmp/foodgram_metrics')
+METRICS_FLUSH_INTERVAL = 1
+# /api/metrics доступен с этих адресов или с заголовком
+# Authorization: Bearer <METRICS_TOKEN>.
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', default='127.0.0.1,::1'
+).split(',')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+QUERY_COUNT_HEADER = os.getenv('QUERY_COUNT_HEADER', default='False') == 'True'
 MAX_LENGTH = 200
 MAX_EMAIL_LENGTH = 254
 MAX_LENGHT_FOR_USER = 150
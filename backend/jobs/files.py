@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings as s
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from jobs.registry import enqueue, task
+
+
+def job_files():
+    """Хранилище файлов задач вне MEDIA_ROOT."""
+    return FileSystemStorage(location=s.JOB_FILES_ROOT)
+
+
+def save_job_file(name, file):
+    """Сохраняем файл и ставим в очередь его удаление.
+
+    Возвращает результат задачи: имя файла в хранилище и срок, до
+    которого его можно скачать.
+    """
+    name = job_files().save(name, file)
+    expires_at = timezone.now() + timedelta(seconds=s.JOB_FILE_TTL)
+    enqueue(delete_job_file, run_after=expires_at, name=name)
+    return {'file': name, 'expires_at': expires_at.isoformat()}
+
+
+def job_file(job):
+    """Имя файла задачи, если он готов и срок хранения не вышел."""
+    result = job.result or {}
+    if 'file' not in result or parse_datetime(
+        result['expires_at']
+    ) <= timezone.now():
+        return None
+    return result['file']
+
+
+@task
+def delete_job_file(name):
+    job_files().delete(name)
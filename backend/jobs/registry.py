@@ -0,0 +1,30 @@
+from jobs.models import Job
+
+TASKS = {}
+
+
+def task(func):
+    """Регистрируем функцию как фоновую задачу под её именем."""
+    TASKS[func.__name__] = func
+    return func
+
+
+def enqueue(func, user=None, run_after=None, **payload):
+    """Ставим задачу в очередь, если задан run_after - не раньше него.
+
+    Запись создаётся в текущей транзакции: если она откатится,
+    задача тоже не появится.
+    """
+    job = Job(name=func.__name__, payload=payload, user=user)
+    if run_after is not None:
+        job.run_after = run_after
+    job.save()
+    return job
+
+
+def enqueue_many(func, user=None, payloads=()):
+    """Ставим в очередь пачку однотипных задач одним запросом."""
+    return Job.objects.bulk_create(
+        Job(name=func.__name__, payload=payload, user=user)
+        for payload in payloads
+    )
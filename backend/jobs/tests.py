@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from jobs.files import delete_job_file, job_files
+from jobs.models import Job
+from jobs.worker import work
+from users.models import User
+
+EXPORT_URL = '/api/recipes/export_shopping_cart/'
+DOWNLOAD_URL = '/api/jobs/{}/download/'
+
+
+class JobFileTests(TestCase):
+    """Выгрузки отдаются только владельцу и удаляются по сроку."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.other = (
+            User.objects.create_user(
+                email=f'{name}@foodgram.local', username=name,
+                first_name='Имя', last_name='Фамилия', password='password'
+            )
+            for name in ('owner', 'other')
+        )
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(JOB_FILES_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def download(self, job_id, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.get(DOWNLOAD_URL.format(job_id))
+
+    def test_download_and_expiry(self):
+        response = self.client.post(EXPORT_URL, {'format': 'txt'})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data['id']
+        self.assertEqual(
+            self.download(job_id, self.owner).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+        work(once=True)
+        name = Job.objects.get(pk=job_id).result['file']
+        self.assertEqual(
+            self.client.get(f'/api/jobs/{job_id}/').data['result']['url'],
+            DOWNLOAD_URL.format(job_id)
+        )
+        self.assertTrue(job_files().exists(name))
+        response = self.download(job_id, self.owner)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content))
+        self.assertEqual(
+            self.download(job_id, self.other).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+        self.assertEqual(
+            self.download(job_id).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        Job.objects.filter(name=delete_job_file.__name__).update(
+            run_after=timezone.now()
+        )
+        work(once=True)
+        self.assertFalse(job_files().exists(name))
+        self.assertEqual(
+            self.download(job_id, self.owner).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
@@ -0,0 +1,32 @@
+import os
+
+from django.conf import settings as s
+from django.http import FileResponse, Http404
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+
+from api.serializers import JobSerializer
+from jobs.files import job_file, job_files
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Статус фоновых задач текущего пользователя."""
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.request.user.jobs.all()
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        """Файл, который подготовила задача, - только её владельцу."""
+        name = job_file(self.get_object())
+        storage = job_files()
+        if name is None or not storage.exists(name):
+            raise Http404('Файл удалён или ещё не готов')
+        _, extension = os.path.splitext(name)
+        return FileResponse(
+            storage.open(name), as_attachment=True,
+            filename=f'{s.FILENAME}{extension}'
+        )
@@ -0,0 +1,89 @@
+import logging
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings as s
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.registry import TASKS
+
+logger = logging.getLogger(__name__)
+
+
+def claim_job():
+    """Забираем следующую готовую к запуску задачу.
+
+    В PostgreSQL строки, занятые другими воркерами, пропускаются через
+    SKIP LOCKED; условный UPDATE защищает от двойного запуска и там, где
+    SELECT FOR UPDATE не поддерживается. В SQLite чтение и запись в одной
+    транзакции приводят к ошибке блокировки, поэтому там транзакции нет.
+    Задачи упавших воркеров снова доступны после истечения блокировки.
+    """
+    now = timezone.now()
+    if connection.features.has_select_for_update:
+        context = transaction.atomic()
+    else:
+        context = nullcontext()
+    with context:
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            Q(status=Job.QUEUED, run_after__lte=now)
+            | Q(status=Job.RUNNING, locked_until__lt=now)
+        ).order_by('run_after', 'id').first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(
+            pk=job.pk, status=job.status, attempts=job.attempts
+        ).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=s.JOB_LOCK_TIMEOUT),
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """Выполняем задачу и сохраняем результат или планируем повтор."""
+    func = TASKS.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'Неизвестная задача {job.name}')
+        result = func(**job.payload)
+    except Exception as error:
+        logger.exception('Задача %s завершилась с ошибкой', job)
+        retry = func is not None and job.attempts < job.max_attempts
+        delay = s.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.QUEUED if retry else Job.FAILED,
+            run_after=timezone.now() + timedelta(seconds=delay),
+            locked_until=None,
+            error=f'{type(error).__name__}: {error}',
+            updated_at=timezone.now(),
+        )
+        return False
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.DONE,
+        result=result,
+        locked_until=None,
+        error='',
+        updated_at=timezone.now(),
+    )
+    return True
+
+
+def work(once=False, poll_interval=s.JOB_POLL_INTERVAL):
+    """Цикл воркера; с once=True выходит, когда очередь опустела."""
+    while True:
+        job = claim_job()
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
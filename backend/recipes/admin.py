@@ -2,6 +2,7 @@ from django.contrib.admin import register, display, ModelAdmin, TabularInline
 
 from recipes.models import (Tag, Ingredient, Recipe, Favorite,
                             RecipeIngredientRelation, ShoppingCart)
+from recipes.shopping_list import recipe_amounts, recipe_changed_in_carts
 
 
 @register(Tag)
@@ -27,14 +28,22 @@ class IngredientInRecipeInline(TabularInline):
 
 @register(Recipe)
 class RecipeAdmin(ModelAdmin):
-    list_display = ('author', 'name', 'count_favorites', 'recipe_tags',)
+    list_display = ('author', 'name', 'count_favorites', 'in_carts_count',
+                    'recipe_tags',)
     list_filter = ('tags', 'author__username', 'author__email', 'name')
     inlines = (IngredientInRecipeInline,)
 
+    def save_related(self, request, form, formsets, change):
+        """Переносим изменения ингредиентов в списки покупок."""
+        old_amounts = recipe_amounts(form.instance) if change else {}
+        super().save_related(request, form, formsets, change)
+        if change:
+            recipe_changed_in_carts(form.instance, old_amounts)
+
     @display(description='Добавления в избранное')
     def count_favorites(self, obj):
         """Счетчик добавления рецепта в избранное."""
-        return obj.favorites.count()
+        return obj.favorites_count
 
     @display(description='')
     def recipe_tags(self, obj):
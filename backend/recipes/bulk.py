@@ -0,0 +1,168 @@
+from collections import defaultdict
+
+from django.conf import settings as s
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.hooks import recipes_saved
+from recipes.models import (Ingredient, Recipe, RecipeIngredientRelation,
+                            ShoppingCart, Tag)
+from recipes.shopping_list import change_shopping_lists
+from recipes.utils import sync_recipe_relations
+
+UNKNOWN_TAGS_ERROR = 'Нет тегов с id: {}'
+UNKNOWN_INGREDIENTS_ERROR = 'Нет ингредиентов с id: {}'
+UNKNOWN_RECIPE_ERROR = 'Нет вашего рецепта с таким id.'
+DUPLICATE_RECIPE_ERROR = 'Рецепт уже изменяется в этом пакете.'
+RECIPE_FIELDS = ('name', 'text', 'cooking_time')
+
+
+def check_references(items, author):
+    """Проверяем ссылки всех рецептов пакета тремя запросами IN.
+
+    items - словарь {номер: провалидированные данные}. Возвращает
+    ошибки в виде {номер: {поле: сообщение}}.
+    """
+    tag_ids = set(Tag.objects.filter(pk__in={
+        tag for data in items.values() for tag in data['tags']
+    }).values_list('pk', flat=True))
+    ingredient_ids = set(Ingredient.objects.filter(pk__in={
+        ingredient['id'] for data in items.values()
+        for ingredient in data['ingredients']
+    }).values_list('pk', flat=True))
+    recipe_ids = set(Recipe.objects.filter(author=author, pk__in={
+        data['id'] for data in items.values() if 'id' in data
+    }).values_list('pk', flat=True))
+    errors = defaultdict(dict)
+    updated = set()
+    for index, data in items.items():
+        unknown_tags = set(data['tags']) - tag_ids
+        if unknown_tags:
+            errors[index]['tags'] = [UNKNOWN_TAGS_ERROR.format(
+                ', '.join(map(str, sorted(unknown_tags)))
+            )]
+        unknown_ingredients = {
+            ingredient['id'] for ingredient in data['ingredients']
+        } - ingredient_ids
+        if unknown_ingredients:
+            errors[index]['ingredients'] = [
+                UNKNOWN_INGREDIENTS_ERROR.format(
+                    ', '.join(map(str, sorted(unknown_ingredients)))
+                )
+            ]
+        if 'id' in data:
+            if data['id'] not in recipe_ids:
+                errors[index]['id'] = [UNKNOWN_RECIPE_ERROR]
+            elif data['id'] in updated:
+                errors[index]['id'] = [DUPLICATE_RECIPE_ERROR]
+            updated.add(data['id'])
+    return dict(errors)
+
+
+def bulk_insert(model, objects):
+    """bulk_create частями; id проставляются и там, где база их не отдаёт.
+
+    SQLite в Django 3.2 не возвращает id из пакетной вставки. Внутри
+    транзакции после вставки SQLite держит блокировку записи, поэтому
+    только что вставленные строки - последние по id.
+    """
+    created = []
+    for start in range(0, len(objects), s.BULK_CREATE_BATCH_SIZE):
+        chunk = model.objects.bulk_create(
+            objects[start:start + s.BULK_CREATE_BATCH_SIZE]
+        )
+        if chunk and chunk[0].pk is None:
+            ids = model.objects.order_by('-pk').values_list(
+                'pk', flat=True
+            )[:len(chunk)]
+            for obj, pk in zip(chunk, reversed(ids)):
+                obj.pk = pk
+        created.extend(chunk)
+    return created
+
+
+def chunked_bulk_create(model, objects):
+    model.objects.bulk_create(objects, batch_size=s.BULK_CREATE_BATCH_SIZE)
+
+
+@transaction.atomic
+def save_recipes(author, items):
+    """Создаём и изменяем рецепты пакетом.
+
+    items - список провалидированных данных рецептов, у изменяемых
+    есть id. Пакетные операции не вызывают сигналы, поэтому списки
+    покупок обновляются здесь же, а остальное после сохранения делает
+    recipes_saved, как и сигнал post_save.
+    Возвращает рецепты в порядке items.
+    """
+    existing = Recipe.objects.in_bulk(
+        [data['id'] for data in items if 'id' in data]
+    )
+    image_field = Recipe._meta.get_field('image')
+    now = timezone.now()
+    recipes, new_recipes = [], []
+    for data in items:
+        recipe = existing.get(data.get('id')) or Recipe(author=author)
+        for field in RECIPE_FIELDS:
+            setattr(recipe, field, data[field])
+        if 'image' in data:
+            recipe.image = data['image']
+        if recipe.pk is None:
+            new_recipes.append(recipe)
+        else:
+            # bulk_update не сохраняет файлы сам, в отличие от bulk_create.
+            if 'image' in data:
+                image_field.pre_save(recipe, False)
+            recipe.updated_at = now
+        recipes.append(recipe)
+    bulk_insert(Recipe, new_recipes)
+    updated = list(existing.values())
+    if updated:
+        Recipe.objects.bulk_update(
+            updated, (*RECIPE_FIELDS, 'image', 'updated_at'),
+            batch_size=s.BULK_CREATE_BATCH_SIZE
+        )
+    old_amounts = sync_recipe_relations({
+        recipe.pk: (data['tags'], {
+            ingredient['id']: ingredient['amount']
+            for ingredient in data['ingredients']
+        })
+        for recipe, data in zip(recipes, items) if recipe.pk in existing
+    }) if updated else {}
+    chunked_bulk_create(Recipe.tags.through, [
+        Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+        for recipe, data in zip(recipes, items)
+        if recipe.pk not in existing
+        for tag_id in data['tags']
+    ])
+    chunked_bulk_create(RecipeIngredientRelation, [
+        RecipeIngredientRelation(
+            recipe_id=recipe.pk,
+            ingredient_id=ingredient['id'],
+            amount=ingredient['amount']
+        )
+        for recipe, data in zip(recipes, items)
+        if recipe.pk not in existing
+        for ingredient in data['ingredients']
+    ])
+    if updated:
+        carts = defaultdict(list)
+        for recipe_id, user_id in ShoppingCart.objects.filter(
+            recipe__in=updated, user__isnull=False
+        ).values_list('recipe_id', 'user_id'):
+            carts[recipe_id].append(user_id)
+        for recipe, data in zip(recipes, items):
+            if recipe.pk not in carts:
+                continue
+            new = {
+                ingredient['id']: ingredient['amount']
+                for ingredient in data['ingredients']
+            }
+            old = old_amounts.get(recipe.pk, {})
+            change_shopping_lists(carts[recipe.pk], {
+                ingredient: new.get(ingredient, 0) - old.get(ingredient, 0)
+                for ingredient in new.keys() | old.keys()
+            })
+    recipes_saved(new_recipes, created=True)
+    recipes_saved(updated, created=False)
+    return recipes
@@ -0,0 +1,139 @@
+from django.conf import settings as s
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Sum
+
+from recipes.counters import change_counter
+from recipes.models import (Favorite, Recipe, RecipeIngredientRelation,
+                            ShoppingCart)
+from recipes.shopping_list import change_shopping_lists
+
+ADDED = 'added'
+REMOVED = 'removed'
+ALREADY_ADDED = 'already_added'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+COLLECTION_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+def collection_state(model, user, recipe_ids):
+    """Какие рецепты существуют и какие уже есть у пользователя."""
+    return dict(Recipe.objects.filter(pk__in=recipe_ids).annotate(
+        present=Exists(model.objects.filter(
+            user=user, recipe=OuterRef('pk')
+        ))
+    ).values_list('pk', 'present'))
+
+
+def change_collection_lists(model, user, recipe_ids, sign):
+    """Счётчик рецептов и, для корзины, список покупок пользователя.
+
+    Пакетные операции не вызывают сигналы, которые делают это
+    для одиночных изменений.
+    """
+    change_counter(
+        Recipe.objects.filter(pk__in=recipe_ids), COLLECTION_COUNTERS[model],
+        sign
+    )
+    if model is ShoppingCart:
+        change_shopping_lists((user.pk,), {
+            ingredient: sign * total
+            for ingredient, total in RecipeIngredientRelation.objects.filter(
+                recipe__in=recipe_ids
+            ).values('ingredient').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient', 'total')
+        })
+
+
+def returned_recipes(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [recipe_id for recipe_id, in cursor.fetchall()]
+
+
+def insert_rows(model, user, recipe_ids):
+    """Вставляем строки (user, recipe) и возвращаем id их рецептов.
+
+    ON CONFLICT DO NOTHING пропускает строки, которые уже вставил
+    параллельный запрос, и RETURNING их не возвращает: счётчики и
+    список покупок меняются только для действительно добавленных.
+    """
+    user_column = model._meta.get_field('user').column
+    recipe_column = model._meta.get_field('recipe').column
+    inserted = []
+    for start in range(0, len(recipe_ids), s.BULK_CREATE_BATCH_SIZE):
+        chunk = recipe_ids[start:start + s.BULK_CREATE_BATCH_SIZE]
+        inserted.extend(returned_recipes(
+            f'INSERT INTO {model._meta.db_table} '
+            f'({user_column}, {recipe_column}) VALUES '
+            + ', '.join(('(%s, %s)',) * len(chunk))
+            + f' ON CONFLICT DO NOTHING RETURNING {recipe_column}',
+            [value for pk in chunk for value in (user.pk, pk)]
+        ))
+    return inserted
+
+
+def delete_rows(model, user, recipe_ids):
+    """Удаляем строки (user, recipe) и возвращаем id их рецептов.
+
+    Строки, которые успел удалить параллельный запрос, в RETURNING
+    не попадают.
+    """
+    user_column = model._meta.get_field('user').column
+    recipe_column = model._meta.get_field('recipe').column
+    deleted = []
+    for start in range(0, len(recipe_ids), s.BULK_CREATE_BATCH_SIZE):
+        chunk = recipe_ids[start:start + s.BULK_CREATE_BATCH_SIZE]
+        deleted.extend(returned_recipes(
+            f'DELETE FROM {model._meta.db_table} '
+            f'WHERE {user_column} = %s AND {recipe_column} IN ('
+            + ', '.join(('%s',) * len(chunk))
+            + f') RETURNING {recipe_column}',
+            [user.pk, *chunk]
+        ))
+    return deleted
+
+
+@transaction.atomic
+def add_to_collection(model, user, recipe_ids):
+    """Добавляем рецепты в избранное или корзину одной вставкой.
+
+    Возвращает {id рецепта: итог}. Что добавлено, решает сама вставка,
+    а не прочитанное до неё состояние: так параллельные запросы
+    не посчитают один рецепт дважды.
+    """
+    state = collection_state(model, user, recipe_ids)
+    added = set(insert_rows(
+        model, user, [pk for pk, present in state.items() if not present]
+    ))
+    if added:
+        change_collection_lists(model, user, list(added), 1)
+    return {
+        pk: NOT_FOUND if pk not in state
+        else ADDED if pk in added else ALREADY_ADDED
+        for pk in recipe_ids
+    }
+
+
+@transaction.atomic
+def remove_from_collection(model, user, recipe_ids):
+    """Убираем рецепты из избранного или корзины одним DELETE.
+
+    Возвращает {id рецепта: итог}. Как и при добавлении, итог берётся
+    из строк, которые удалил этот запрос. Сигналы удаления не нужны:
+    счётчики и список покупок обновляются здесь же.
+    """
+    state = collection_state(model, user, recipe_ids)
+    removed = set(delete_rows(
+        model, user, [pk for pk, present in state.items() if present]
+    ))
+    if removed:
+        change_collection_lists(model, user, list(removed), -1)
+    return {
+        pk: NOT_FOUND if pk not in state
+        else REMOVED if pk in removed else NOT_ADDED
+        for pk in recipe_ids
+    }
@@ -0,0 +1,96 @@
+from collections import defaultdict
+
+from django.conf import settings as s
+from django.db.models import Count
+
+from recipes.models import Recipe, TimelineEntry
+from users.models import Follow, User
+
+
+def fan_out(recipes):
+    """Раскладываем новые рецепты по лентам подписчиков их авторов.
+
+    Автор, у которого подписчиков больше FEED_FANOUT_LIMIT, получает
+    флаг feed_on_read: его рецепты подмешиваются в ленты при чтении.
+    Флаг не снимается, иначе рецепты, опубликованные с ним, выпали бы
+    из лент.
+    """
+    by_author = defaultdict(list)
+    for recipe in recipes:
+        by_author[recipe.author_id].append(recipe.pk)
+    followers = dict(User.objects.filter(
+        pk__in=by_author, feed_on_read=False
+    ).annotate(followers=Count('followed')).values_list('pk', 'followers'))
+    popular = [
+        author for author, total in followers.items()
+        if total > s.FEED_FANOUT_LIMIT
+    ]
+    if popular:
+        User.objects.filter(pk__in=popular).update(feed_on_read=True)
+    authors = [
+        author for author, total in followers.items()
+        if 0 < total <= s.FEED_FANOUT_LIMIT
+    ]
+    if not authors:
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                subscriber_id=subscriber_id, author_id=author_id,
+                recipe_id=recipe_id
+            )
+            for subscriber_id, author_id in Follow.objects.filter(
+                author__in=authors
+            ).values_list('subscriber_id', 'author_id').iterator()
+            for recipe_id in by_author[author_id]
+        ),
+        batch_size=s.BULK_CREATE_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def backfill(follow):
+    """Последние рецепты автора в ленту нового подписчика."""
+    if follow.author.feed_on_read:
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                subscriber_id=follow.subscriber_id,
+                author_id=follow.author_id, recipe_id=recipe_id
+            )
+            for recipe_id in Recipe.objects.filter(
+                author_id=follow.author_id
+            ).order_by('-id').values_list(
+                'pk', flat=True
+            )[:s.FEED_BACKFILL_SIZE]
+        ),
+        ignore_conflicts=True
+    )
+
+
+def trim(follow):
+    """Убираем рецепты автора из ленты отписавшегося."""
+    TimelineEntry.objects.filter(
+        subscriber_id=follow.subscriber_id, author_id=follow.author_id
+    ).delete()
+
+
+def feed_recipe_ids(user, before, limit):
+    """id рецептов ленты по убыванию, меньшие before, двумя запросами.
+
+    К записям ленты добавляются рецепты авторов с feed_on_read из
+    подписок. Рецепт может найтись в обоих источниках, если автор
+    получил флаг позже публикации.
+    """
+    entries = TimelineEntry.objects.filter(subscriber=user)
+    pulled = Recipe.objects.filter(author__in=Follow.objects.filter(
+        subscriber=user, author__feed_on_read=True
+    ).values('author'))
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+        pulled = pulled.filter(pk__lt=before)
+    ids = set(entries.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True
+    )[:limit])
+    ids.update(pulled.order_by('-id').values_list('pk', flat=True)[:limit])
+    return sorted(ids, reverse=True)[:limit]
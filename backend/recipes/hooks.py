@@ -0,0 +1,45 @@
+from collections import Counter, defaultdict
+
+from jobs.registry import enqueue_many
+from recipes.counters import change_counter
+from recipes.feed import fan_out
+from recipes.models import Recipe
+from recipes.pantry import record_ingredient_changes
+from recipes.response_cache import invalidate_recipe_lists, invalidate_recipes
+from recipes.search import update_search_vector
+from recipes.similar import update_similar_index
+from recipes.tasks import build_recipe_renditions
+from users.models import User
+
+
+def recipes_saved(recipes, created):
+    """Всё, что следует за сохранением рецептов.
+
+    Вызывается сигналом post_save для одного рецепта и save_recipes для
+    пакета, который сигналов не вызывает. created - рецепты новые.
+    """
+    recipes = list(recipes)
+    if not recipes:
+        return
+    ids = [recipe.pk for recipe in recipes]
+    if created:
+        fan_out(recipes)
+        record_ingredient_changes(ids)
+        for author_id, count in Counter(
+            recipe.author_id for recipe in recipes
+        ).items():
+            change_counter(
+                User.objects.filter(pk=author_id), 'recipes_count', count
+            )
+    update_search_vector(Recipe.objects.filter(pk__in=ids))
+    renditions = defaultdict(list)
+    for recipe in recipes:
+        if recipe.image and recipe.renditions_source != recipe.image.name:
+            renditions[recipe.author_id].append(recipe)
+    for author_recipes in renditions.values():
+        enqueue_many(build_recipe_renditions, author_recipes[0].author, (
+            {'recipe_id': recipe.pk} for recipe in author_recipes
+        ))
+    update_similar_index(ids)
+    invalidate_recipes(ids)
+    invalidate_recipe_lists()
@@ -0,0 +1,108 @@
+import os
+from io import BytesIO
+
+from django.conf import settings as s
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import Recipe
+from recipes.response_cache import invalidate_recipes
+
+RENDITIONS_DIR = 'renditions'
+WEBP_SUFFIX = '_webp'
+IMAGE_FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+
+
+def rendition_extension(image_name):
+    """JPEG остаётся JPEG, остальные форматы сохраняем в PNG."""
+    extension = os.path.splitext(image_name)[1].lower()
+    return 'jpg' if extension in ('.jpg', '.jpeg') else 'png'
+
+
+def rendition_names(recipe_id, image_name):
+    """Имена файлов всех вариантов картинки.
+
+    Варианты лежат в каталоге рецепта, а в имя входит имя оригинала
+    вместе с расширением: base64-картинки все называются temp.<ext>,
+    и по одной основе имени варианты разных картинок совпали бы.
+    """
+    base = os.path.basename(image_name).replace('.', '_')
+    names = {}
+    for rendition in s.IMAGE_RENDITIONS:
+        for suffix, extension in (
+            ('', rendition_extension(image_name)), (WEBP_SUFFIX, 'webp')
+        ):
+            names[rendition + suffix] = (
+                f'{RENDITIONS_DIR}/{recipe_id}/{base}_{rendition}.{extension}'
+            )
+    return names
+
+
+def delete_files(names):
+    for name in names:
+        if default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def delete_renditions(recipe_id):
+    """Удаляем все варианты картинок рецепта."""
+    directory = f'{RENDITIONS_DIR}/{recipe_id}'
+    if default_storage.exists(directory):
+        _, files = default_storage.listdir(directory)
+        delete_files(f'{directory}/{name}' for name in files)
+
+
+def save_rendition(name, image):
+    buffer = BytesIO()
+    image.save(
+        buffer, IMAGE_FORMATS[os.path.splitext(name)[1][1:]],
+        quality=s.IMAGE_RENDITION_QUALITY
+    )
+    delete_files((name,))
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_renditions(recipe):
+    """Готовим уменьшенные копии картинки рецепта и их WebP-варианты."""
+    if not recipe.image:
+        return
+    image_name = recipe.image.name
+    with default_storage.open(image_name) as file:
+        original = Image.open(file)
+        original.load()
+    if rendition_extension(image_name) == 'jpg':
+        original = original.convert('RGB')
+    elif original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    names = rendition_names(recipe.pk, image_name)
+    for rendition, size in s.IMAGE_RENDITIONS.items():
+        image = original.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        save_rendition(names[rendition], image)
+        save_rendition(names[rendition + WEBP_SUFFIX], image)
+    if Recipe.objects.filter(pk=recipe.pk, image=image_name).update(
+        renditions_source=image_name, updated_at=timezone.now()
+    ):
+        invalidate_recipes((recipe.pk,))
+        if recipe.renditions_source and (
+            recipe.renditions_source != image_name
+        ):
+            # Варианты прежней картинки больше не нужны.
+            delete_files(set(rendition_names(
+                recipe.pk, recipe.renditions_source
+            ).values()) - set(names.values()))
+
+
+def rendition_urls(recipe):
+    """Адреса вариантов картинки; пока их нет - адрес оригинала."""
+    if not recipe.image:
+        return None
+    names = rendition_names(recipe.pk, recipe.image.name)
+    if recipe.renditions_source != recipe.image.name:
+        return dict.fromkeys(names, recipe.image.url)
+    return {
+        rendition: default_storage.url(name)
+        for rendition, name in names.items()
+    }
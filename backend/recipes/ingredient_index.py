@@ -0,0 +1,65 @@
+from bisect import bisect_left, bisect_right
+from uuid import uuid4
+
+from django.conf import settings as s
+from django.core.cache import cache
+
+from recipes.models import Ingredient
+
+VERSION_CACHE_KEY = 'ingredient_index_version'
+PREFIX_END = '\U0010ffff'
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Хранит отсортированный массив названий в нижнем регистре и
+    перестраивается, когда меняется метка версии в кэше Django.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._keys = ()
+        self._rows = ()
+
+    def _load(self):
+        version = cache.get_or_set(VERSION_CACHE_KEY, uuid4().hex, None)
+        if version == self._version:
+            return self._keys, self._rows
+        ingredients = sorted(
+            (name.lower(), pk, name, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = tuple(item[0] for item in ingredients)
+        rows = tuple(
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for _, pk, name, unit in ingredients
+        )
+        self._keys, self._rows, self._version = keys, rows, version
+        return keys, rows
+
+    def search(self, query, limit=s.INGREDIENT_SEARCH_LIMIT):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        query = query.strip().lower()
+        keys, rows = self._load()
+        start = bisect_left(keys, query)
+        end = bisect_right(keys, query + PREFIX_END, lo=start)
+        result = list(rows[start:min(end, start + limit)])
+        if len(result) < limit:
+            for position, key in enumerate(keys):
+                if start <= position < end or query not in key:
+                    continue
+                result.append(rows[position])
+                if len(result) == limit:
+                    break
+        return result
+
+
+def invalidate_ingredient_index():
+    """Сообщаем всем процессам, что индекс нужно перестроить."""
+    cache.set(VERSION_CACHE_KEY, uuid4().hex, None)
+
+
+ingredient_index = IngredientIndex()
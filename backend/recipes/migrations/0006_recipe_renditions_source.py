@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_source',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='Картинка, для которой готовы уменьшенные копии'),
+        ),
+    ]
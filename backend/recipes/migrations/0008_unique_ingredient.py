@@ -0,0 +1,72 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливаем одинаковые ингредиенты перед добавлением ограничения."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredientRelation = apps.get_model(
+        'recipes', 'RecipeIngredientRelation'
+    )
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        keep = group['keep']
+        extra = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(pk=keep).values_list('id', flat=True))
+        for relation in RecipeIngredientRelation.objects.filter(
+            ingredient__in=extra
+        ):
+            kept = RecipeIngredientRelation.objects.filter(
+                recipe_id=relation.recipe_id, ingredient_id=keep
+            ).first()
+            if kept is None:
+                relation.ingredient_id = keep
+                relation.save(update_fields=('ingredient',))
+            else:
+                # Количество складываем, как в списках покупок: иначе
+                # агрегат списков разойдётся с рецептами.
+                kept.amount += relation.amount
+                kept.save(update_fields=('amount',))
+                relation.delete()
+        for item in ShoppingListItem.objects.filter(ingredient__in=extra):
+            kept = ShoppingListItem.objects.filter(
+                user_id=item.user_id, ingredient_id=keep
+            ).first()
+            if kept is None:
+                item.ingredient_id = keep
+                item.save(update_fields=('ingredient',))
+            else:
+                kept.amount += item.amount
+                kept.save(update_fields=('amount',))
+                item.delete()
+        for cart in ShoppingCart.objects.filter(ingredients__in=extra):
+            if ShoppingCart.objects.filter(
+                user_id=cart.user_id, ingredients_id=keep
+            ).exists():
+                cart.delete()
+            else:
+                cart.ingredients_id = keep
+                cart.save(update_fields=('ingredients',))
+        Ingredient.objects.filter(pk__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """Сливаем теги с одинаковым слагом перед добавлением уникальности."""
+    Tag = apps.get_model('recipes', 'Tag')
+    RecipeTag = apps.get_model('recipes', 'Recipe').tags.through
+    duplicates = Tag.objects.values('slug').annotate(
+        keep=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for group in duplicates:
+        keep = group['keep']
+        extra = Tag.objects.filter(slug=group['slug']).exclude(pk=keep)
+        tagged = RecipeTag.objects.filter(tag_id=keep).values('recipe_id')
+        RecipeTag.objects.bulk_create(
+            (
+                RecipeTag(recipe_id=recipe_id, tag_id=keep)
+                for recipe_id in RecipeTag.objects.filter(
+                    tag__in=extra
+                ).exclude(recipe_id__in=tagged).values_list(
+                    'recipe_id', flat=True
+                ).distinct()
+            ),
+        )
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(max_length=200, unique=True, verbose_name='Уникальный слаг'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['user', 'recipe'], name='cart_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredientrelation',
+            index=models.Index(fields=['recipe', 'ingredient', 'amount'], name='recipe_ingredient_amount_idx'),
+        ),
+        # Автоматическая таблица связи рецептов и тегов индексирует
+        # tag_id отдельно; для фильтра по тегам нужна пара (tag, recipe).
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_idx',
+        ),
+    ]
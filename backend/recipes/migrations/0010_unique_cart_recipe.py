@@ -0,0 +1,66 @@
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Убираем повторные рецепты в корзинах перед добавлением уникальности.
+
+    Каждая копия учтена в счётчике и в списке покупок, поэтому
+    затронутые счётчики и списки пересчитываются.
+    """
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    RecipeIngredientRelation = apps.get_model(
+        'recipes', 'RecipeIngredientRelation'
+    )
+    Recipe = apps.get_model('recipes', 'Recipe')
+    duplicates = list(ShoppingCart.objects.filter(
+        user__isnull=False
+    ).values('user', 'recipe').annotate(
+        keep=Min('id'), total=Count('id')
+    ).filter(total__gt=1))
+    if not duplicates:
+        return
+    for group in duplicates:
+        ShoppingCart.objects.filter(
+            user=group['user'], recipe=group['recipe']
+        ).exclude(pk=group['keep']).delete()
+    for recipe_id in {group['recipe'] for group in duplicates}:
+        Recipe.objects.filter(pk=recipe_id).update(
+            in_carts_count=ShoppingCart.objects.filter(
+                recipe=recipe_id
+            ).count()
+        )
+    users = {group['user'] for group in duplicates}
+    ShoppingListItem.objects.filter(user__in=users).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=row['user'], ingredient_id=row['ingredient'],
+            amount=row['total']
+        )
+        for row in RecipeIngredientRelation.objects.filter(
+            recipe__groceries__user__in=users
+        ).annotate(user=F('recipe__groceries__user')).values(
+            'user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        # Индекс уникальности покрывает те же (user, recipe).
+        migrations.RemoveIndex(
+            model_name='shoppingcart',
+            name='cart_user_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_cart_recipe'),
+        ),
+    ]
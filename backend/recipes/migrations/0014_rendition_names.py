@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def reset_renditions(apps, schema_editor):
+    """Варианты теперь лежат в каталогах рецептов под другими именами.
+
+    До выполнения build_renditions отдаётся оригинал картинки.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.exclude(renditions_source='').update(renditions_source='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipeingredientschange'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_renditions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from importlib import import_module
+
+from django.db import migrations, models
+
+merge_duplicate_ingredients = import_module(
+    'recipes.migrations.0008_unique_ingredient'
+).merge_duplicate_ingredients
+
+
+def fill_empty_units(apps, schema_editor):
+    """NULL не совпадает с NULL в уникальном ограничении, поэтому
+    ингредиенты без единицы получают пустую строку и сливаются."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    Ingredient.objects.filter(measurement_unit=None).update(
+        measurement_unit=''
+    )
+    merge_duplicate_ingredients(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_rendition_names'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ingredient',
+            name='unique_ingredient',
+        ),
+        migrations.RunPython(fill_empty_units, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='measurement_unit',
+            field=models.CharField(max_length=200, verbose_name='Единицы измерения'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
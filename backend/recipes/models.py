@@ -1,9 +1,10 @@
 from django.conf import settings as s
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.db import models
 
 from recipes.abstract_models import AbstractModelForCartAndFavorite
-from users.models import User
+from users.models import CountersMixin, User
 
 NOT_A_HEX_COLOR_ERROR = 'Введенное значение не является цветом в формате HEX'
 MIN_COOKING_TIME_ERROR = f'Минимальное время готовки - {s.MIN_COOKING_TIME}'
@@ -20,6 +21,7 @@ class Tag(models.Model):
     )
     slug = models.SlugField(
         max_length=s.MAX_LENGTH,
+        unique=True,
         verbose_name='Уникальный слаг',
     )
     color = models.CharField(
@@ -58,10 +60,15 @@ class Ingredient(models.Model):
     measurement_unit = models.CharField(
         max_length=s.MAX_LENGTH,
         verbose_name='Единицы измерения',
-        null=True
     )
 
     class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient',
+            ),
+        )
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
@@ -70,8 +77,10 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Модель рецепта."""
+    counter_fields = ('favorites_count', 'in_carts_count')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -117,11 +126,39 @@ class Recipe(models.Model):
             ),
         ),
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в корзину',
+    )
+    renditions_source = models.CharField(
+        max_length=s.MAX_LENGTH,
+        blank=True,
+        editable=False,
+        verbose_name='Картинка, для которой готовы уменьшенные копии',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-id',)
+        indexes = (
+            models.Index(fields=('author', '-id'), name='recipe_author_idx'),
+        )
 
     def __str__(self):
         return self.name
@@ -145,6 +182,10 @@ class ShoppingCart(AbstractModelForCartAndFavorite):
                 fields=('user', 'ingredients'),
                 name='unique_grocery'
             ),
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_cart_recipe'
+            ),
         )
 
     def __str__(self):
@@ -204,6 +245,162 @@ class RecipeIngredientRelation(models.Model):
                 name='unique_ingredient_recipe'
             ),
         )
+        indexes = (
+            # Покрывающий индекс для сложения ингредиентов из корзины.
+            models.Index(
+                fields=('recipe', 'ingredient', 'amount'),
+                name='recipe_ingredient_amount_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.amount} {self.ingredient}'
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+
+    Агрегат поддерживается при изменении корзины и рецептов в ней,
+    чтобы список покупок читался одним запросом.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount}'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика, добавляется при публикации.
+
+    Автор хранится в записи, чтобы при отписке удалять его рецепты
+    из ленты без соединения с рецептами.
+    """
+    subscriber = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            # Индекс уникальности служит и для чтения ленты по курсору.
+            models.UniqueConstraint(
+                fields=('subscriber', 'recipe'),
+                name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('subscriber', 'author'), name='timeline_author_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.subscriber}'
+
+
+class RecipeSignature(models.Model):
+    """MinHash-подпись набора ингредиентов рецепта."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Рецепт'
+    )
+    minhash = models.BinaryField(verbose_name='Подпись')
+
+    class Meta:
+        verbose_name = 'Подпись рецепта'
+        verbose_name_plural = 'Подписи рецептов'
+
+    def __str__(self):
+        return f'Подпись {self.recipe_id}'
+
+
+class RecipeBand(models.Model):
+    """Корзина LSH: хэш одной полосы подписи рецепта.
+
+    Рецепты, совпавшие хотя бы в одной корзине, - кандидаты в похожие.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='bands',
+        verbose_name='Рецепт'
+    )
+    bucket = models.BigIntegerField(verbose_name='Хэш полосы')
+
+    class Meta:
+        verbose_name = 'Полоса подписи'
+        verbose_name_plural = 'Полосы подписей'
+        indexes = (
+            models.Index(
+                fields=('bucket', 'recipe'), name='recipe_band_bucket_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.bucket}'
+
+
+class RecipeIngredientsChange(models.Model):
+    """Журнал изменений состава рецептов.
+
+    По нему индексы в памяти процессов догоняют базу, не перестраиваясь
+    целиком. Рецепт хранится числом: запись об удалении рецепта должна
+    пережить сам рецепт.
+    """
+    recipe_id = models.BigIntegerField(verbose_name='id рецепта')
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Время изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Изменение состава рецепта'
+        verbose_name_plural = 'Изменения состава рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.created_at}'
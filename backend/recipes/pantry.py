@@ -0,0 +1,296 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings as s
+from django.utils import timezone
+
+from recipes.models import (Recipe, RecipeIngredientRelation,
+                            RecipeIngredientsChange)
+
+# Ингредиенты, которые есть больше чем в 1/DENSE_RATIO рецептов, хранятся
+# битовыми картами, остальные - массивами номеров рецептов. Карта
+# занимает бит на каждый рецепт индекса, но при запросе её не нужно
+# собирать из массива: на миллионе рецептов так быстрее при небольшом
+# росте памяти.
+DENSE_RATIO = 128
+ITERATOR_CHUNK_SIZE = 10000
+# Запись журнала с этим id рецепта требует полной сборки индекса.
+REBUILD = 0
+
+
+class StaleIndex(Exception):
+    """Изменение нельзя применить к индексу, нужна полная сборка."""
+
+
+def to_bitmap(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def add_bitmap(planes, bitmap):
+    """Прибавляем единицу рецептам из bitmap к счётчикам в битовых срезах.
+
+    planes[j] - карта рецептов, у которых j-й бит счётчика равен 1.
+    """
+    carry = bitmap
+    for number, plane in enumerate(planes):
+        if not carry:
+            return
+        planes[number], carry = plane ^ carry, plane & carry
+    if carry:
+        planes.append(carry)
+
+
+def subtract_planes(minuend, subtrahend, full):
+    """Поразрядная разность счётчиков; вычитаемое не больше уменьшаемого."""
+    result, borrow = [], 0
+    for number in range(max(len(minuend), len(subtrahend))):
+        first = minuend[number] if number < len(minuend) else 0
+        second = subtrahend[number] if number < len(subtrahend) else 0
+        result.append(first ^ second ^ borrow)
+        borrow = ((full ^ first) & second) | (
+            (full ^ (first ^ second)) & borrow
+        )
+    return result
+
+
+def equal_to(planes, value, full):
+    """Карта рецептов, у которых счётчик равен value."""
+    if value >> len(planes):
+        return 0
+    result = full
+    for number, plane in enumerate(planes):
+        result &= plane if value >> number & 1 else full ^ plane
+        if not result:
+            break
+    return result
+
+
+class PantryIndex:
+    """Обратный индекс ингредиентов в памяти процесса.
+
+    Рецепты пронумерованы по возрастанию id. Для каждого ингредиента
+    хранится отсортированный массив номеров его рецептов или, если
+    рецептов много, битовая карта в виде int. Число ингредиентов
+    рецептов хранится битовыми срезами, так покрытие считается
+    поразрядными операциями сразу над всеми рецептами.
+
+    Индекс догоняет базу по журналу RecipeIngredientsChange. Записи
+    читаются с запасом PANTRY_JOURNAL_LAG: транзакция могла получить
+    время записи раньше, чем зафиксировалась.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.synced_at = None
+        self.applied = frozenset()
+        self.recipe_ids = array('q')
+        self.postings = {}
+        self.totals = []
+
+    def build(self, now):
+        RecipeIngredientsChange.objects.filter(
+            created_at__lt=now - timedelta(
+                seconds=s.PANTRY_JOURNAL_RETENTION
+            )
+        ).delete()
+        recipe_ids = array('q', Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+        size = len(recipe_ids)
+        counts = array('H', bytes(2 * size))
+        postings = defaultdict(lambda: array('i'))
+        position = 0
+        for recipe_id, ingredient_id in (
+            RecipeIngredientRelation.objects.order_by(
+                'recipe_id'
+            ).values_list('recipe_id', 'ingredient_id').iterator(
+                chunk_size=ITERATOR_CHUNK_SIZE
+            )
+        ):
+            while position < size and recipe_ids[position] < recipe_id:
+                position += 1
+            if position == size or recipe_ids[position] != recipe_id:
+                continue
+            postings[ingredient_id].append(position)
+            counts[position] += 1
+        self.recipe_ids = recipe_ids
+        self.postings = {
+            ingredient_id: to_bitmap(positions, size)
+            if len(positions) * DENSE_RATIO > size else positions
+            for ingredient_id, positions in postings.items()
+        }
+        self.totals = [
+            to_bitmap(
+                (
+                    position for position, count in enumerate(counts)
+                    if count >> number & 1
+                ),
+                size
+            )
+            for number in range(max(counts, default=0).bit_length())
+        ]
+        self.synced_at = now
+        # Остальные записи окна применятся повторно: изменения могли
+        # зафиксироваться после чтения рецептов.
+        self.applied = frozenset(RecipeIngredientsChange.objects.filter(
+            recipe_id=REBUILD,
+            created_at__gte=now - timedelta(seconds=s.PANTRY_JOURNAL_LAG)
+        ).values_list('pk', flat=True))
+
+    def position(self, recipe_id):
+        position = bisect_left(self.recipe_ids, recipe_id)
+        if (position < len(self.recipe_ids)
+                and self.recipe_ids[position] == recipe_id):
+            return position
+        return None
+
+    def clear(self, position):
+        bit = 1 << position
+        for ingredient_id, posting in self.postings.items():
+            if isinstance(posting, int):
+                if posting >> position & 1:
+                    self.postings[ingredient_id] = posting ^ bit
+                continue
+            index = bisect_left(posting, position)
+            if index < len(posting) and posting[index] == position:
+                del posting[index]
+
+    def set_total(self, position, count):
+        bit = 1 << position
+        while len(self.totals) < count.bit_length():
+            self.totals.append(0)
+        for number, plane in enumerate(self.totals):
+            if count >> number & 1:
+                self.totals[number] = plane | bit
+            elif plane >> position & 1:
+                self.totals[number] = plane ^ bit
+
+    def patch(self, recipe_ids):
+        """Переносим в индекс текущий состав рецептов.
+
+        Рецепты могут зафиксироваться не в порядке id; если новый
+        рецепт оказался меньше последнего в индексе, номера пришлось бы
+        сдвигать - тогда индекс собирается заново.
+        """
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in (
+            RecipeIngredientRelation.objects.filter(
+                recipe__in=recipe_ids
+            ).values_list('recipe_id', 'ingredient_id')
+        ):
+            ingredients[recipe_id].append(ingredient_id)
+        for recipe_id in sorted(recipe_ids):
+            position = self.position(recipe_id)
+            if position is None:
+                if recipe_id not in ingredients:
+                    continue
+                if self.recipe_ids and recipe_id < self.recipe_ids[-1]:
+                    raise StaleIndex
+                position = len(self.recipe_ids)
+                self.recipe_ids.append(recipe_id)
+            else:
+                self.clear(position)
+            for ingredient_id in ingredients[recipe_id]:
+                posting = self.postings.setdefault(
+                    ingredient_id, array('i')
+                )
+                if isinstance(posting, int):
+                    self.postings[ingredient_id] = posting | 1 << position
+                else:
+                    insort(posting, position)
+            self.set_total(position, len(ingredients[recipe_id]))
+
+    def refresh(self):
+        now = timezone.now()
+        if self.synced_at is None or now - self.synced_at > timedelta(
+            seconds=s.PANTRY_JOURNAL_RETENTION - s.PANTRY_JOURNAL_LAG
+        ):
+            self.build(now)
+            return
+        changes = dict(RecipeIngredientsChange.objects.filter(
+            created_at__gte=self.synced_at - timedelta(
+                seconds=s.PANTRY_JOURNAL_LAG
+            )
+        ).values_list('pk', 'recipe_id'))
+        pending = {
+            recipe_id for pk, recipe_id in changes.items()
+            if pk not in self.applied
+        }
+        if REBUILD in pending:
+            self.build(now)
+            return
+        if pending:
+            try:
+                self.patch(pending)
+            except StaleIndex:
+                self.build(now)
+                return
+        self.applied = frozenset(changes)
+        self.synced_at = now
+
+    def search(self, ingredient_ids, max_missing, limit):
+        """Рецепты, которые можно приготовить из ingredient_ids.
+
+        Возвращает [(id рецепта, есть ингредиентов, не хватает)]: сначала
+        меньше недостающих, затем больше доля имеющихся, затем новее.
+        """
+        with self.lock:
+            self.refresh()
+            size = len(self.recipe_ids)
+            full = (1 << size) - 1
+            postings = [
+                self.postings[ingredient_id]
+                for ingredient_id in set(ingredient_ids)
+                if ingredient_id in self.postings
+            ]
+            covered = []
+            for posting in postings:
+                add_bitmap(covered, posting if isinstance(posting, int)
+                           else to_bitmap(posting, size))
+            if not covered:
+                return []
+            missing = subtract_planes(self.totals, covered, full)
+            by_covered = {}
+            results = []
+            for absent in range(max_missing + 1):
+                candidates = equal_to(missing, absent, full)
+                for present in range(len(postings), 0, -1):
+                    if not candidates:
+                        break
+                    if present not in by_covered:
+                        by_covered[present] = equal_to(
+                            covered, present, full
+                        )
+                    matches = candidates & by_covered[present]
+                    candidates ^= matches
+                    while matches:
+                        position = matches.bit_length() - 1
+                        matches ^= 1 << position
+                        results.append(
+                            (self.recipe_ids[position], present, absent)
+                        )
+                        if len(results) == limit:
+                            return results
+            return results
+
+
+def record_ingredient_changes(recipe_ids):
+    """Отмечаем в журнале рецепты, у которых поменялся состав."""
+    RecipeIngredientsChange.objects.bulk_create(
+        RecipeIngredientsChange(recipe_id=recipe_id)
+        for recipe_id in set(recipe_ids)
+    )
+
+
+def invalidate_pantry_index():
+    """Все процессы соберут индекс заново: для пакетных загрузок."""
+    record_ingredient_changes((REBUILD,))
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,82 @@
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.db import transaction
+
+GENERATION_CACHE_KEY = 'recipe_responses_generation'
+VERSION_CACHE_KEY = 'recipe_response_version:{}'
+LIST_CACHE_KEY = 'recipe_response_list:{}:{}'
+DETAIL_CACHE_KEY = 'recipe_response_detail:{}'
+
+
+def list_cache_key(request):
+    """Ключ страницы списка: фильтры, страница и поколение списков.
+
+    Поколение меняется, когда может измениться состав выдачи: рецепт
+    создан, изменён, удалён или у него поменялись теги.
+    """
+    generation = cache.get_or_set(GENERATION_CACHE_KEY, uuid4().hex, None)
+    params = sorted(request.query_params.lists())
+    digest = hashlib.sha256(
+        repr((request.get_host(), params)).encode()
+    ).hexdigest()
+    return LIST_CACHE_KEY.format(generation, digest)
+
+
+def detail_cache_key(request, pk):
+    """Ключ рецепта; в ответе абсолютные ссылки на картинки с хостом."""
+    return DETAIL_CACHE_KEY.format(hashlib.sha256(
+        repr((request.get_host(), str(pk))).encode()
+    ).hexdigest())
+
+
+def recipe_versions(ids):
+    """Текущие версии рецептов; недостающие создаются.
+
+    Читать версии нужно до загрузки рецептов из базы: тогда изменение,
+    случившееся после загрузки, сменит версию и ответ не будет выдан.
+    """
+    keys = {pk: VERSION_CACHE_KEY.format(pk) for pk in ids}
+    versions = cache.get_many(keys.values())
+    for key in keys.values():
+        if key not in versions:
+            cache.add(key, uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return {pk: versions[key] for pk, key in keys.items()}
+
+
+def get_cached_response(key):
+    """Данные и валидаторы ответа, если ни один рецепт в нём не менялся."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    versions, data, validators = entry
+    current = cache.get_many(
+        VERSION_CACHE_KEY.format(pk) for pk in versions
+    )
+    for pk, version in versions.items():
+        if current.get(VERSION_CACHE_KEY.format(pk)) != version:
+            return None
+    return data, validators
+
+
+def cache_response(key, versions, data, validators):
+    cache.set(key, (versions, data, validators), s.RESPONSE_CACHE_TIMEOUT)
+
+
+def invalidate_recipes(ids):
+    """Сбрасываем ответы с этими рецептами после фиксации транзакции."""
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: cache.set_many(
+            {VERSION_CACHE_KEY.format(pk): uuid4().hex for pk in ids}, None
+        ))
+
+
+def invalidate_recipe_lists():
+    """Сбрасываем все страницы списков: изменился их состав."""
+    transaction.on_commit(
+        lambda: cache.set(GENERATION_CACHE_KEY, uuid4().hex, None)
+    )
@@ -0,0 +1,42 @@
+from django.conf import settings as s
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import connection
+from django.db.models import F, Q
+
+RECIPE_SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config=s.SEARCH_CONFIG)
+    + SearchVector('text', weight='B', config=s.SEARCH_CONFIG)
+)
+
+
+def full_text_search_enabled():
+    """Полнотекстовый поиск доступен только в PostgreSQL."""
+    return connection.vendor == 'postgresql'
+
+
+def update_search_vector(queryset):
+    """Пересчитываем сохранённый tsvector для рецептов из queryset."""
+    if full_text_search_enabled():
+        queryset.update(search_vector=RECIPE_SEARCH_VECTOR)
+
+
+def search_recipes(queryset, text):
+    """Ищем рецепты по названию и описанию, лучшие совпадения первыми.
+
+    В PostgreSQL ранжируем по tsvector и триграммному сходству названия,
+    в остальных базах ограничиваемся icontains.
+    """
+    if not full_text_search_enabled():
+        return queryset.filter(
+            Q(name__icontains=text) | Q(text__icontains=text)
+        )
+    query = SearchQuery(text, config=s.SEARCH_CONFIG, search_type='websearch')
+    return queryset.annotate(
+        search_rank=(
+            SearchRank(F('search_vector'), query)
+            + TrigramSimilarity('name', text)
+        )
+    ).filter(
+        Q(search_vector=query) | Q(name__trigram_similar=text)
+    ).order_by('-search_rank', '-id')
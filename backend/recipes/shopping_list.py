@@ -0,0 +1,478 @@
+import csv
+import hashlib
+import struct
+import zlib
+from functools import cached_property, lru_cache
+from itertools import chain
+
+from django.conf import settings as s
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from recipes.models import (RecipeIngredientRelation, ShoppingCart,
+                            ShoppingListItem)
+
+TITLE = 'Список покупок:'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+# Страница A4, размеры в пунктах PDF.
+PAGE_SIZE = (595, 842)
+PAGE_MARGIN = 48
+FONT_SIZE = 13
+LINE_HEIGHT = 20
+LINES_PER_PAGE = (PAGE_SIZE[1] - 2 * PAGE_MARGIN) // LINE_HEIGHT
+# Номера постоянных объектов PDF; страницы нумеруются после них.
+CATALOG, PAGES, FONT, CID_FONT, FONT_DESCRIPTOR, FONT_FILE, TO_UNICODE = (
+    range(1, 8)
+)
+ITERATOR_CHUNK_SIZE = 500
+FONT_NAME = b'Verdana'
+# Таблицы, которые нужны программам просмотра для глифов TrueType в PDF.
+SUBSET_TABLES = (
+    'cvt ', 'fpgm', 'glyf', 'head', 'hhea', 'hmtx', 'loca', 'maxp', 'prep'
+)
+CHECKSUM_MAGIC = 0xB1B0AFBA
+# Флаги составных глифов и размеры их необязательных полей.
+ARGS_ARE_WORDS = 0x0001
+MORE_COMPONENTS = 0x0020
+COMPONENT_TRANSFORMS = ((0x0008, 2), (0x0040, 4), (0x0080, 8))
+
+
+def get_shopping_list(user):
+    """Список покупок пользователя из предрассчитанного агрегата."""
+    return ShoppingListItem.objects.filter(user=user).annotate(
+        ingredient_amount=F('amount')
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit',
+        'ingredient_amount'
+    ).order_by('ingredient__name').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def calculate_shopping_lists(**filters):
+    """Свежий расчёт списков покупок суммированием по корзинам."""
+    return RecipeIngredientRelation.objects.filter(
+        recipe__groceries__user__isnull=False, **filters
+    ).values(
+        'recipe__groceries__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+
+
+def change_shopping_lists(user_ids, amounts):
+    """Прибавляем к спискам покупок пользователей количества ингредиентов.
+
+    amounts - словарь {id ингредиента: изменение количества}, изменение
+    может быть отрицательным. Опустевшие позиции удаляются.
+    """
+    amounts = {
+        ingredient: amount for ingredient, amount in amounts.items()
+        if amount
+    }
+    if not user_ids or not amounts:
+        return
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+            for user_id in user_ids for ingredient_id in amounts
+        ),
+        ignore_conflicts=True
+    )
+    items = ShoppingListItem.objects.filter(
+        user__in=user_ids, ingredient__in=amounts
+    )
+    # Если агрегат разошёлся с рецептами, сумма может стать
+    # отрицательной, а поле её не примет: обрезаем до нуля.
+    items.update(amount=Greatest(F('amount') + Case(
+        *(When(ingredient_id=ingredient_id, then=Value(amount))
+          for ingredient_id, amount in amounts.items()),
+    ), Value(0)))
+    items.filter(amount__lte=0).delete()
+
+
+def recipe_amounts(recipe):
+    return dict(recipe.related_recipe.values_list('ingredient_id', 'amount'))
+
+
+def add_recipe_to_shopping_list(user_id, recipe, sign=1):
+    """Учитываем добавление (sign=1) или удаление (sign=-1) из корзины."""
+    change_shopping_lists((user_id,), {
+        ingredient: sign * amount
+        for ingredient, amount in recipe_amounts(recipe).items()
+    })
+
+
+def recipe_changed_in_carts(recipe, old_amounts):
+    """Переносим изменение ингредиентов рецепта в списки покупок."""
+    new_amounts = recipe_amounts(recipe)
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe=recipe, user__isnull=False
+    ).values_list('user_id', flat=True))
+    change_shopping_lists(user_ids, {
+        ingredient: new_amounts.get(ingredient, 0) - old_amounts.get(
+            ingredient, 0
+        ) for ingredient in new_amounts.keys() | old_amounts.keys()
+    })
+
+
+def shopping_list_lines(ingredients):
+    for ingredient in ingredients:
+        name = ingredient['ingredient__name']
+        unit = ingredient['ingredient__measurement_unit']
+        amount = ingredient['ingredient_amount']
+        yield f'{name} - {amount}, {unit}'
+
+
+def render_txt(ingredients):
+    yield f'{TITLE}\n'
+    for line in shopping_list_lines(ingredients):
+        yield f'\n{line}'
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient_amount'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+class TrueTypeFont:
+    """Таблицы TrueType-шрифта, нужные для встраивания в PDF.
+
+    Текст в PDF записывается номерами глифов (кодировка Identity-H),
+    поэтому нужны таблица cmap (символ - глиф) и ширины глифов.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.tables = {}
+        for number in range(struct.unpack_from('>H', data, 4)[0]):
+            tag, _, offset, length = struct.unpack_from(
+                '>4sIII', data, 12 + 16 * number
+            )
+            self.tables[tag.decode('latin-1')] = data[offset:offset + length]
+        head, hhea = self.tables['head'], self.tables['hhea']
+        self.units = struct.unpack_from('>H', head, 18)[0]
+        self.bbox = [
+            self.scale(value) for value in struct.unpack_from('>4h', head, 36)
+        ]
+        ascent, descent = struct.unpack_from('>2h', hhea, 4)
+        self.ascent, self.descent = self.scale(ascent), self.scale(descent)
+        metrics = struct.unpack_from('>H', hhea, 34)[0]
+        self.widths = [
+            self.scale(width) for width, _ in struct.iter_unpack(
+                '>Hh', self.tables['hmtx'][:4 * metrics]
+            )
+        ]
+        self.loca = self.read_loca()
+
+    def scale(self, value):
+        """Единицы шрифта в тысячные доли кегля, как принято в PDF."""
+        return value * 1000 // self.units
+
+    def read_loca(self):
+        """Смещения глифов в таблице glyf, на одно больше числа глифов."""
+        count = struct.unpack_from('>H', self.tables['maxp'], 4)[0] + 1
+        if struct.unpack_from('>h', self.tables['head'], 50)[0]:
+            return struct.unpack_from('>%dI' % count, self.tables['loca'])
+        return [
+            2 * offset for offset in
+            struct.unpack_from('>%dH' % count, self.tables['loca'])
+        ]
+
+    @cached_property
+    def glyphs(self):
+        """Юникод-подтаблица cmap формата 4: символ - номер глифа.
+
+        В подмножестве шрифта для PDF таблицы cmap нет.
+        """
+        data = self.tables['cmap']
+        for number in range(struct.unpack_from('>H', data, 2)[0]):
+            platform, encoding, table = struct.unpack_from(
+                '>HHI', data, 4 + 8 * number
+            )
+            if (platform, encoding) in ((3, 1), (0, 3)) and struct.unpack_from(
+                '>H', data, table
+            )[0] == 4:
+                break
+        else:
+            raise ValueError('В шрифте нет юникодной таблицы cmap')
+        segments = struct.unpack_from('>H', data, table + 6)[0] // 2
+        ends = table + 14
+        starts = ends + 2 * segments + 2
+        deltas = starts + 2 * segments
+        range_offsets = deltas + 2 * segments
+        glyphs = {}
+        for segment in range(segments):
+            end, start, delta, range_offset = (
+                struct.unpack_from(format, data, array + 2 * segment)[0]
+                for format, array in (
+                    ('>H', ends), ('>H', starts), ('>h', deltas),
+                    ('>H', range_offsets)
+                )
+            )
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset:
+                    glyph = struct.unpack_from(
+                        '>H', data, range_offsets + 2 * segment
+                        + range_offset + 2 * (code - start)
+                    )[0]
+                    glyph = glyph and (glyph + delta) & 0xFFFF
+                else:
+                    glyph = (code + delta) & 0xFFFF
+                if glyph:
+                    glyphs[code] = glyph
+        return glyphs
+
+    def width(self, glyph):
+        return self.widths[min(glyph, len(self.widths) - 1)]
+
+    def outline(self, glyph):
+        return self.tables['glyf'][self.loca[glyph]:self.loca[glyph + 1]]
+
+    @staticmethod
+    def components(outline):
+        """Глифы, из которых собран составной глиф (например, «й»)."""
+        if not outline or struct.unpack_from('>h', outline)[0] >= 0:
+            return
+        position = 10
+        while True:
+            flags, glyph = struct.unpack_from('>HH', outline, position)
+            yield glyph
+            if not flags & MORE_COMPONENTS:
+                return
+            position += 4 + (4 if flags & ARGS_ARE_WORDS else 2)
+            for flag, size in COMPONENT_TRANSFORMS:
+                if flags & flag:
+                    position += size
+                    break
+
+    def subset(self, used):
+        """Шрифт, в котором остались только контуры использованных глифов.
+
+        Номера глифов не меняются, поэтому CIDToGIDMap остаётся
+        тождественной, а остальные глифы становятся пустыми.
+        """
+        keep, pending = set(), [0, *used]
+        while pending:
+            glyph = pending.pop()
+            if glyph not in keep and glyph < len(self.loca) - 1:
+                keep.add(glyph)
+                pending.extend(self.components(self.outline(glyph)))
+        outlines, loca = [], [0]
+        for glyph in range(len(self.loca) - 1):
+            if glyph in keep:
+                outline = self.outline(glyph)
+                outlines.append(outline + b'\0' * (-len(outline) % 4))
+                loca.append(loca[-1] + len(outlines[-1]))
+            else:
+                loca.append(loca[-1])
+        head = bytearray(self.tables['head'])
+        head[8:12] = bytes(4)
+        # Смещения пишем 32-битными, новая таблица glyf может быть любой.
+        struct.pack_into('>h', head, 50, 1)
+        tables = {
+            tag: self.tables[tag] for tag in SUBSET_TABLES
+            if tag in self.tables
+        }
+        tables.update(
+            head=bytes(head), glyf=b''.join(outlines),
+            loca=struct.pack('>%dI' % len(loca), *loca)
+        )
+        return build_sfnt(tables)
+
+
+def checksum(data):
+    data += b'\0' * (-len(data) % 4)
+    return sum(struct.unpack('>%dI' % (len(data) // 4), data)) & 0xFFFFFFFF
+
+
+def build_sfnt(tables):
+    """Собираем файл TrueType из таблиц."""
+    count = len(tables)
+    power = 1 << (count.bit_length() - 1)
+    header = struct.pack(
+        '>IHHHH', 0x00010000, count, 16 * power, power.bit_length() - 1,
+        16 * (count - power)
+    )
+    offset = len(header) + 16 * count
+    directory, body, offsets = [], [], {}
+    for tag in sorted(tables):
+        data = tables[tag]
+        directory.append(struct.pack(
+            '>4sIII', tag.encode('latin-1'), checksum(data), offset,
+            len(data)
+        ))
+        offsets[tag] = offset
+        body.append(data + b'\0' * (-len(data) % 4))
+        offset += len(body[-1])
+    font = bytearray(header + b''.join(directory) + b''.join(body))
+    struct.pack_into(
+        '>I', font, offsets['head'] + 8,
+        (CHECKSUM_MAGIC - checksum(bytes(font))) & 0xFFFFFFFF
+    )
+    return bytes(font)
+
+
+@lru_cache(maxsize=None)
+def get_font():
+    """Шрифт читается и разбирается один раз на процесс."""
+    with open(s.SHOPPING_LIST_FONT, 'rb') as file:
+        return TrueTypeFont(file.read())
+
+
+def subset_name(used):
+    """Префикс имени подмножества шрифта: шесть заглавных букв."""
+    digest = hashlib.md5(repr(sorted(used)).encode()).digest()
+    return bytes(65 + byte % 26 for byte in digest[:6]) + b'+' + FONT_NAME
+
+
+def encode_line(font, line, used):
+    """Строка как номера глифов; used запоминает символ каждого глифа."""
+    codes = []
+    for char in line:
+        glyph = font.glyphs.get(ord(char), 0)
+        used.setdefault(glyph, char)
+        codes.append(b'%04X' % glyph)
+    return b'<' + b''.join(codes) + b'>'
+
+
+def to_unicode_cmap(used):
+    """CMap, по которой программы просмотра извлекают и ищут текст."""
+    lines = [
+        b'/CIDInit /ProcSet findresource begin 12 dict begin begincmap',
+        b'/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+        b'/Supplement 0 >> def',
+        b'/CMapName /Adobe-Identity-UCS def /CMapType 2 def',
+        b'1 begincodespacerange <0000> <FFFF> endcodespacerange',
+    ]
+    glyphs = sorted(used)
+    for start in range(0, len(glyphs), 100):
+        chunk = glyphs[start:start + 100]
+        lines.append(b'%d beginbfchar' % len(chunk))
+        lines.extend(
+            b'<%04X> <%s>' % (
+                glyph, used[glyph].encode('utf-16-be').hex().upper().encode()
+            )
+            for glyph in chunk
+        )
+        lines.append(b'endbfchar')
+    lines.append(
+        b'endcmap CMapName currentdict /CMap defineresource pop end end'
+    )
+    return b'\n'.join(lines)
+
+
+def paginate(lines, size):
+    page = []
+    for line in lines:
+        page.append(line)
+        if len(page) == size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def render_pdf(ingredients):
+    """Потоковая выгрузка PDF с текстом, который можно выделить и найти.
+
+    Встраиваются только глифы, которые есть в тексте. Объекты пишутся
+    по мере готовности страниц, а шрифт, ширины глифов, таблица для
+    извлечения текста, дерево страниц и таблица ссылок - в конце файла,
+    поэтому в памяти держится только текущая страница.
+    """
+    font = get_font()
+    offsets = {}
+    position = 0
+
+    def write(number, body, stream=None):
+        nonlocal position
+        offsets[number] = position
+        chunk = b'%d 0 obj\n' % number + body
+        if stream is not None:
+            chunk += b'\nstream\n' + stream + b'\nendstream'
+        chunk += b'\nendobj\n'
+        position += len(chunk)
+        return chunk
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position = len(header)
+    yield header
+    lines = chain((TITLE, ''), shopping_list_lines(ingredients))
+    used = {}
+    pages = []
+    number = TO_UNICODE
+    for page_lines in paginate(lines, LINES_PER_PAGE):
+        content, page = number + 1, number + 2
+        number = page
+        text = b'BT /F1 %d Tf %d TL %d %d Td ' % (
+            FONT_SIZE, LINE_HEIGHT, PAGE_MARGIN,
+            PAGE_SIZE[1] - PAGE_MARGIN - FONT_SIZE
+        ) + b' T* '.join(
+            encode_line(font, line, used) + b' Tj' for line in page_lines
+        ) + b' ET'
+        stream = zlib.compress(text)
+        yield write(content, b'<< /Length %d /Filter /FlateDecode >>' % (
+            len(stream)
+        ), stream)
+        yield write(page, (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>'
+        ) % (PAGES, *PAGE_SIZE, FONT, content))
+        pages.append(page)
+    font_file = font.subset(used)
+    compressed = zlib.compress(font_file)
+    yield write(FONT_FILE, (
+        b'<< /Length %d /Length1 %d /Filter /FlateDecode >>'
+    ) % (len(compressed), len(font_file)), compressed)
+    name = subset_name(used)
+    yield write(FONT_DESCRIPTOR, (
+        b'<< /Type /FontDescriptor /FontName /%s /Flags 32 '
+        b'/FontBBox [%d %d %d %d] /ItalicAngle 0 /Ascent %d /Descent %d '
+        b'/CapHeight %d /StemV 80 /FontFile2 %d 0 R >>'
+    ) % (name, *font.bbox, font.ascent, font.descent, font.ascent,
+         FONT_FILE))
+    widths = b' '.join(
+        b'%d [%d]' % (glyph, font.width(glyph)) for glyph in sorted(used)
+    )
+    yield write(CID_FONT, (
+        b'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /%s '
+        b'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) '
+        b'/Supplement 0 >> /FontDescriptor %d 0 R /CIDToGIDMap /Identity '
+        b'/W [%s] >>'
+    ) % (name, FONT_DESCRIPTOR, widths))
+    cmap = to_unicode_cmap(used)
+    yield write(TO_UNICODE, b'<< /Length %d >>' % len(cmap), cmap)
+    yield write(FONT, (
+        b'<< /Type /Font /Subtype /Type0 /BaseFont /%s '
+        b'/Encoding /Identity-H /DescendantFonts [%d 0 R] '
+        b'/ToUnicode %d 0 R >>'
+    ) % (name, CID_FONT, TO_UNICODE))
+    kids = b' '.join(b'%d 0 R' % page for page in pages)
+    yield write(PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        kids, len(pages)
+    ))
+    yield write(CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % PAGES)
+    xref = [b'xref\n0 %d\n' % (number + 1), b'0000000000 65535 f \n']
+    xref.extend(
+        b'%010d 00000 n \n' % offsets[obj] for obj in range(1, number + 1)
+    )
+    yield b''.join(xref) + (
+        b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+    ) % (number + 1, CATALOG, position)
+
+
+SHOPPING_LIST_EXPORTERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'pdf': render_pdf,
+}
@@ -0,0 +1,217 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.counters import change_counter
+from recipes.feed import backfill, trim
+from recipes.hooks import recipes_saved
+from recipes.images import delete_renditions
+from recipes.ingredient_index import invalidate_ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe,
+                            RecipeIngredientRelation, ShoppingCart, Tag)
+from recipes.pantry import record_ingredient_changes
+from recipes.response_cache import invalidate_recipe_lists, invalidate_recipes
+from recipes.shopping_list import add_recipe_to_shopping_list
+from recipes.tags import invalidate_tag_slugs
+from users.models import Follow, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    """Перестраиваем индекс автодополнения при изменении ингредиентов."""
+    invalidate_ingredient_index()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_slugs_changed(**kwargs):
+    """Сбрасываем карту слагов для фильтра по тегам."""
+    invalidate_tag_slugs()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created, **kwargs):
+    """Поисковый вектор, копии картинки, ленты, счётчик и кэш ответов."""
+    recipes_saved((instance,), created)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_renditions_deleted(instance, **kwargs):
+    """Варианты картинки удаляются вместе с рецептом."""
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: delete_renditions(recipe_id))
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def tag_changed(instance, **kwargs):
+    """Изменение тега меняет выдачу всех рецептов с этим тегом."""
+    Recipe.objects.filter(tags=instance).update(updated_at=timezone.now())
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def ingredient_in_recipes_changed(instance, **kwargs):
+    """Изменение ингредиента меняет выдачу рецептов с ним."""
+    Recipe.objects.filter(ingredients=instance).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def recipe_added_to_cart(instance, created, **kwargs):
+    if created and instance.user_id:
+        add_recipe_to_shopping_list(instance.user_id, instance.recipe)
+
+
+@receiver(pre_delete, sender=Recipe)
+@receiver(pre_delete, sender=Favorite)
+@receiver(pre_delete, sender=ShoppingCart)
+def row_locked(sender, instance, **kwargs):
+    """Блокируем удаляемую строку до конца транзакции.
+
+    post_delete приходит, даже если строку уже удалил параллельный
+    запрос, поэтому счётчики и список покупок меняем, только если
+    строка ещё была.
+    """
+    instance._row_exists = sender.objects.select_for_update().filter(
+        pk=instance.pk
+    ).exists()
+
+
+def row_existed(instance):
+    return getattr(instance, '_row_exists', True)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def recipe_removed_from_cart(instance, **kwargs):
+    """До удаления, пока ингредиенты рецепта ещё на месте.
+
+    Срабатывает и при каскадном удалении рецепта или пользователя.
+    """
+    if instance.user_id and row_existed(instance):
+        add_recipe_to_shopping_list(instance.user_id, instance.recipe, -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_counted(instance, **kwargs):
+    """Счётчик рецептов автора, в том числе при каскадном удалении."""
+    if row_existed(instance):
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+        )
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorite_counted(instance, created=None, signal=None, **kwargs):
+    if signal is post_save and not created:
+        return
+    if signal is post_delete and not row_existed(instance):
+        return
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count',
+        1 if created else -1
+    )
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def cart_counted(instance, created=None, signal=None, **kwargs):
+    if signal is post_save and not created:
+        return
+    if signal is post_delete and not row_existed(instance):
+        return
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'in_carts_count',
+        1 if created else -1
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_response_changed(instance, **kwargs):
+    """Сбрасываем закэшированные ответы анонимным пользователям.
+
+    Избранное и корзины меняют только счётчики и флаги, которых
+    в анонимных ответах нет, поэтому кэш не трогают. После сохранения
+    рецепта кэш сбрасывает recipes_saved.
+    """
+    invalidate_recipes((instance.pk,))
+    invalidate_recipe_lists()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Теги и ингредиенты рецепта, в том числе со стороны тега."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        ids = (instance.pk,)
+    elif pk_set is not None:
+        ids = pk_set
+    else:
+        field = 'tags' if sender is Recipe.tags.through else 'ingredients'
+        ids = Recipe.objects.filter(
+            **{field: instance}
+        ).values_list('pk', flat=True)
+    invalidate_recipes(ids)
+    if sender is Recipe.tags.through:
+        invalidate_recipe_lists()
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredientRelation)
+def recipe_ingredient_changed(instance, **kwargs):
+    invalidate_recipes((instance.recipe_id,))
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def tag_responses_changed(instance, **kwargs):
+    invalidate_recipes(
+        Recipe.objects.filter(tags=instance).values_list('pk', flat=True)
+    )
+    invalidate_recipe_lists()
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def ingredient_responses_changed(instance, **kwargs):
+    invalidate_recipes(
+        Recipe.objects.filter(
+            ingredients=instance
+        ).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def author_responses_changed(instance, created, update_fields=None,
+                             **kwargs):
+    """Имя автора входит в ответы с его рецептами."""
+    if created or update_fields and (
+        set(update_fields) <= {'last_login', 'password'}
+    ):
+        return
+    invalidate_recipes(
+        Recipe.objects.filter(author=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(instance, created, **kwargs):
+    if created:
+        backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(instance, **kwargs):
+    trim(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredientRelation)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    """Журнал для индекса поиска по продуктам.
+
+    Новые рецепты отмечает recipes_saved: их ингредиенты добавляются
+    в той же транзакции и к моменту чтения журнала уже на месте.
+    """
+    record_ingredient_changes((
+        instance.pk if sender is Recipe else instance.recipe_id,
+    ))
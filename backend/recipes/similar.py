@@ -0,0 +1,158 @@
+import hashlib
+import random
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings as s
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import (Recipe, RecipeBand, RecipeIngredientRelation,
+                            RecipeSignature)
+
+# Хэш-функции вида (a * x + b) mod p. Зерно фиксировано: подписи,
+# посчитанные в разных процессах и в разное время, сравнимы.
+PRIME = (1 << 61) - 1
+HASH_SEED = 1
+SIGNATURE_TYPE = 'q'
+
+
+def make_permutations(size):
+    generator = random.Random(HASH_SEED)
+    return tuple(
+        (generator.randrange(1, PRIME), generator.randrange(PRIME))
+        for _ in range(size)
+    )
+
+
+PERMUTATIONS = make_permutations(s.SIMILAR_MINHASH_SIZE)
+
+
+@lru_cache(maxsize=None)
+def ingredient_hashes(ingredient_id):
+    """Значения всех хэш-функций для ингредиента.
+
+    Ингредиентов намного меньше, чем рецептов, поэтому подпись
+    рецепта - это поэлементный минимум готовых кортежей.
+    """
+    return tuple((a * ingredient_id + b) % PRIME for a, b in PERMUTATIONS)
+
+
+def minhash(ingredient_ids):
+    return array(SIGNATURE_TYPE, map(
+        min, zip(*map(ingredient_hashes, ingredient_ids))
+    ))
+
+
+def buckets(signature):
+    """Хэши полос подписи; номер полосы входит в хэш."""
+    for band, start in enumerate(
+        range(0, len(signature), s.SIMILAR_BAND_SIZE)
+    ):
+        digest = hashlib.blake2b(
+            signature[start:start + s.SIMILAR_BAND_SIZE].tobytes(),
+            digest_size=8, salt=band.to_bytes(8, 'little')
+        ).digest()
+        yield int.from_bytes(digest, 'little', signed=True)
+
+
+def load_signature(value):
+    signature = array(SIGNATURE_TYPE)
+    signature.frombytes(value)
+    return signature
+
+
+def similarity(first, second):
+    """Оценка коэффициента Жаккара: доля совпавших значений подписи."""
+    return sum(map(int.__eq__, first, second)) / len(first)
+
+
+def recipe_signatures(recipes):
+    """Подписи рецептов из queryset; рецепты без ингредиентов пропускаются.
+
+    Только читает базу, поэтому при полной пересборке считается
+    параллельно в нескольких процессах.
+    """
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id in RecipeIngredientRelation.objects.filter(
+        recipe__in=recipes
+    ).values_list('recipe_id', 'ingredient_id').iterator():
+        ingredients[recipe_id].append(ingredient_id)
+    return {
+        recipe_id: minhash(ingredient_ids)
+        for recipe_id, ingredient_ids in ingredients.items()
+    }
+
+
+@transaction.atomic
+def store_signatures(recipes, signatures):
+    """Заменяем подписи и корзины LSH рецептов из queryset."""
+    RecipeSignature.objects.filter(recipe__in=recipes).delete()
+    RecipeBand.objects.filter(recipe__in=recipes).delete()
+    RecipeSignature.objects.bulk_create(
+        (
+            RecipeSignature(recipe_id=recipe_id, minhash=signature.tobytes())
+            for recipe_id, signature in signatures.items()
+        ),
+        batch_size=s.BULK_CREATE_BATCH_SIZE
+    )
+    RecipeBand.objects.bulk_create(
+        (
+            RecipeBand(recipe_id=recipe_id, bucket=bucket)
+            for recipe_id, signature in signatures.items()
+            for bucket in buckets(signature)
+        ),
+        batch_size=s.BULK_CREATE_BATCH_SIZE
+    )
+
+
+def index_recipes(recipes):
+    store_signatures(recipes, recipe_signatures(recipes))
+
+
+def update_similar_index(recipe_ids):
+    """Переиндексируем рецепты после фиксации транзакции.
+
+    К этому моменту ингредиенты нового рецепта уже сохранены.
+    """
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: index_recipes(
+            Recipe.objects.filter(pk__in=recipe_ids)
+        ))
+
+
+def similar_recipes(recipe_id, limit):
+    """Похожие рецепты [(id, сходство)], лучшие первыми, двумя запросами.
+
+    Кандидаты - рецепты с общими корзинами, больше всего общих первыми;
+    сходство оценивается по подписям.
+    """
+    candidates = list(RecipeBand.objects.filter(
+        bucket__in=RecipeBand.objects.filter(
+            recipe=recipe_id
+        ).values('bucket')
+    ).exclude(recipe=recipe_id).values('recipe').annotate(
+        shared=Count('pk')
+    ).order_by('-shared', '-recipe').values_list(
+        'recipe', flat=True
+    )[:s.SIMILAR_CANDIDATES])
+    if not candidates:
+        return []
+    signatures = {
+        pk: load_signature(value)
+        for pk, value in RecipeSignature.objects.filter(
+            recipe__in=(recipe_id, *candidates)
+        ).values_list('recipe', 'minhash')
+    }
+    own = signatures.pop(recipe_id, None)
+    if own is None:
+        return []
+    return sorted(
+        (
+            (pk, similarity(own, signature))
+            for pk, signature in signatures.items()
+        ),
+        key=lambda item: (-item[1], -item[0])
+    )[:limit]
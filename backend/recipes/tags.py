@@ -0,0 +1,34 @@
+from uuid import uuid4
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Tag
+
+VERSION_CACHE_KEY = 'tag_slugs_version'
+SLUGS_CACHE_KEY = 'tag_slugs:{}'
+
+
+def get_tag_ids(slugs):
+    """id тегов по слагам из кэша, неизвестные слаги пропускаются.
+
+    Карта слагов хранится под ключом с меткой версии, прочитанной
+    до запроса к базе, поэтому устаревшая карта не переживёт сброс.
+    Пакетные вставки обходят сигналы и должны вызывать
+    invalidate_tag_slugs сами; на случай пропуска карта живёт
+    ограниченное время.
+    """
+    version = cache.get_or_set(VERSION_CACHE_KEY, uuid4().hex, None)
+    key = SLUGS_CACHE_KEY.format(version)
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, s.TAG_SLUGS_CACHE_TIMEOUT)
+    return {tag_ids[slug] for slug in slugs if slug in tag_ids}
+
+
+def invalidate_tag_slugs():
+    transaction.on_commit(
+        lambda: cache.set(VERSION_CACHE_KEY, uuid4().hex, None)
+    )
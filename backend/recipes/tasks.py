@@ -0,0 +1,32 @@
+import tempfile
+import uuid
+
+from django.core.files import File
+
+from jobs.files import save_job_file
+from jobs.registry import task
+from recipes.images import build_renditions
+from recipes.models import Recipe
+from recipes.shopping_list import SHOPPING_LIST_EXPORTERS, get_shopping_list
+from users.models import User
+
+
+@task
+def build_recipe_renditions(recipe_id):
+    """Уменьшенные копии картинки рецепта."""
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is not None:
+        build_renditions(recipe)
+
+
+@task
+def export_shopping_list(user_id, export_format):
+    """Выгрузка списка покупок в файл, который скачивают через задачу."""
+    user = User.objects.get(pk=user_id)
+    name = f'{uuid.uuid4().hex}.{export_format}'
+    with tempfile.TemporaryFile() as file:
+        for chunk in SHOPPING_LIST_EXPORTERS[export_format](
+            get_shopping_list(user)
+        ):
+            file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        return save_job_file(name, File(file))
@@ -0,0 +1,701 @@
+import base64
+import json
+import re
+import shutil
+import tempfile
+import zlib
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework import status
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.management.commands.explain_filters import (BIG_TABLES, SEQ_SCAN,
+                                                     Command)
+from jobs.models import Job
+from recipes.images import build_renditions, rendition_names
+from recipes.models import (Favorite, Ingredient, Recipe,
+                            RecipeIngredientRelation,
+                            RecipeIngredientsChange, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.shopping_list import (CHECKSUM_MAGIC, LINES_PER_PAGE, TITLE,
+                                   TrueTypeFont, calculate_shopping_lists,
+                                   checksum, get_font, render_pdf)
+from recipes.tasks import build_recipe_renditions
+from users.models import Follow, User
+
+RECIPES_URL = '/api/recipes/'
+RECIPE_URL = '/api/recipes/{}/'
+CART_URL = '/api/recipes/{}/shopping_cart/'
+RECIPES_COUNT = 8
+PAGE_SIZES = (1, 3, RECIPES_COUNT)
+# Число запросов не зависит от размера страницы. Пользователю нужен
+# ещё запрос авторов, на которых он подписан.
+LIST_QUERY_BUDGET = {'anonymous': 5, 'authenticated': 6}
+DETAIL_QUERY_BUDGET = {'anonymous': 4, 'authenticated': 5}
+LOCMEM_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+}}
+
+
+def create_recipes():
+    """Рецепты двух авторов с тегами, ингредиентами и списками читателя.
+
+    Возвращает читателя, подписанного на первого автора.
+    """
+    user = User.objects.create_user(
+        email='reader@foodgram.local', username='reader',
+        first_name='Читатель', last_name='Тестовый', password='password'
+    )
+    authors = [
+        User.objects.create_user(
+            email=f'author{number}@foodgram.local',
+            username=f'author{number}', first_name='Автор',
+            last_name='Тестовый', password='password'
+        )
+        for number in range(2)
+    ]
+    Follow.objects.create(subscriber=user, author=authors[0])
+    tags = [
+        Tag.objects.create(
+            name=f'Тег {number}', slug=f'tag-{number}',
+            color=f'#00000{number}'
+        )
+        for number in range(3)
+    ]
+    ingredients = [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г'
+        )
+        for number in range(5)
+    ]
+    for number in range(RECIPES_COUNT):
+        recipe = Recipe.objects.create(
+            author=authors[number % 2], name=f'Рецепт {number}',
+            text='Текст', image='recipes/images/test.jpg',
+            cooking_time=10
+        )
+        recipe.tags.set(tags[number % 3:number % 3 + 2])
+        RecipeIngredientRelation.objects.bulk_create(
+            RecipeIngredientRelation(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+            for ingredient in ingredients[number % 5:number % 5 + 3]
+        )
+        if number % 2:
+            Favorite.objects.create(user=user, recipe=recipe)
+        if number % 3:
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+    return user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecipeQueryBudgetTests(TestCase):
+    """Список и рецепт загружаются фиксированным числом запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_recipes()
+        cls.recipe = Recipe.objects.latest('pk')
+
+    def setUp(self):
+        cache.clear()
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        self.clients = {
+            'anonymous': APIClient(), 'authenticated': authenticated
+        }
+
+    def test_list(self):
+        for name, client in self.clients.items():
+            for limit in PAGE_SIZES:
+                with self.subTest(client=name, limit=limit):
+                    cache.clear()
+                    with self.assertNumQueries(LIST_QUERY_BUDGET[name]):
+                        response = client.get(RECIPES_URL, {'limit': limit})
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertEqual(len(response.data['results']), limit)
+
+    def test_detail(self):
+        for name, client in self.clients.items():
+            with self.subTest(client=name):
+                with self.assertNumQueries(DETAIL_QUERY_BUDGET[name]):
+                    response = client.get(RECIPE_URL.format(self.recipe.pk))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data['ingredients']), 3)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN нужен PostgreSQL')
+class FilterIndexTests(TestCase):
+    """Фильтры рецептов, подписки и список покупок читают индексы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_recipes()
+
+    def test_no_sequential_scans(self):
+        with connection.cursor() as cursor:
+            # На маленьких таблицах планировщик выбирает полный просмотр,
+            # поэтому запрещаем его и смотрим, есть ли индекс.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, queryset in Command().queries(self.user):
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                self.assertFalse(
+                    set(SEQ_SCAN.findall(plan)) & set(BIG_TABLES), plan
+                )
+
+
+def image_file(name, image_format):
+    buffer = BytesIO()
+    Image.new('RGB', (800, 600), 'red').save(buffer, image_format)
+    return ContentFile(buffer.getvalue(), name=name)
+
+
+class RenditionTests(TestCase):
+    """Варианты картинок разных рецептов не пересекаются."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.local', username='author',
+            first_name='Автор', last_name='Тестовый', password='password'
+        )
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_recipe(self, name, image_format):
+        return Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            image=image_file(name, image_format), cooking_time=10
+        )
+
+    def test_names_keep_original_extension(self):
+        names = [
+            set(rendition_names(1, f'recipes/images/temp.{extension}')
+                .values())
+            for extension in ('png', 'jpg', 'jpeg')
+        ]
+        names.append(set(rendition_names(2, 'recipes/images/temp.png')
+                         .values()))
+        for number, first in enumerate(names):
+            for second in names[number + 1:]:
+                self.assertFalse(first & second)
+
+    def test_old_renditions_are_deleted(self):
+        recipe = self.create_recipe('temp.png', 'PNG')
+        other = self.create_recipe('temp.jpeg', 'JPEG')
+        build_renditions(recipe)
+        build_renditions(other)
+        old = set(rendition_names(recipe.pk, recipe.image.name).values())
+        recipe.refresh_from_db()
+        recipe.image = image_file('temp.jpg', 'JPEG')
+        recipe.save()
+        build_renditions(recipe)
+        new = set(rendition_names(recipe.pk, recipe.image.name).values())
+        other_names = rendition_names(other.pk, other.image.name).values()
+        self.assertFalse(any(map(default_storage.exists, old)))
+        self.assertTrue(all(map(default_storage.exists, new)))
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertFalse(any(map(default_storage.exists, new)))
+        self.assertTrue(all(map(default_storage.exists, other_names)))
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f'{name}@foodgram.local', username=name, first_name='Имя',
+        last_name='Фамилия', password='password'
+    )
+
+
+def authenticated_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ShoppingListTests(TestCase):
+    """Агрегат списка покупок совпадает с суммой по рецептам корзины."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.author = create_user('author')
+        cls.tag = Tag.objects.create(name='Тег', slug='tag', color='#000000')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(3)
+        ]
+        cls.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Текст',
+                image='recipes/images/test.jpg', cooking_time=10
+            )
+            recipe.tags.set((cls.tag,))
+            RecipeIngredientRelation.objects.bulk_create(
+                RecipeIngredientRelation(
+                    recipe=recipe, ingredient=ingredient,
+                    amount=100 * (number + 1)
+                )
+                for ingredient in cls.ingredients[number:number + 2]
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = authenticated_client(self.reader)
+
+    def assertListMatchesCart(self):
+        expected = {
+            row['ingredient']: row['total']
+            for row in calculate_shopping_lists(
+                recipe__groceries__user=self.reader
+            )
+        }
+        self.assertEqual(dict(ShoppingListItem.objects.filter(
+            user=self.reader
+        ).values_list('ingredient', 'amount')), expected)
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                recipe.in_carts_count, recipe.groceries.count()
+            )
+
+    def test_cart_and_recipe_edits(self):
+        for recipe in self.recipes:
+            response = self.client.post(CART_URL.format(recipe.pk))
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertListMatchesCart()
+        response = self.client.post(CART_URL.format(self.recipes[0].pk))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = authenticated_client(self.author).patch(
+                RECIPE_URL.format(self.recipes[0].pk), {
+                    'tags': [self.tag.pk],
+                    'ingredients': [
+                        {'id': self.ingredients[1].pk, 'amount': 7},
+                        {'id': self.ingredients[2].pk, 'amount': 3},
+                    ],
+                    'cooking_time': 5,
+                }, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListMatchesCart()
+        for expected in (status.HTTP_204_NO_CONTENT,
+                         status.HTTP_404_NOT_FOUND):
+            response = self.client.delete(CART_URL.format(self.recipes[0].pk))
+            self.assertEqual(response.status_code, expected)
+            self.assertListMatchesCart()
+        response = self.client.delete(CART_URL.format('unknown'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_cart(self):
+        url = RECIPES_URL + 'shopping_cart/bulk/'
+        ids = [recipe.pk for recipe in self.recipes]
+        self.client.post(CART_URL.format(ids[0]))
+        response = self.client.post(
+            url, {'recipes': [*ids, 0]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            {item['id']: item['status'] for item in response.data},
+            {ids[0]: 'already_added', ids[1]: 'added', 0: 'not_found'}
+        )
+        self.assertListMatchesCart()
+        response = self.client.delete(url, {'recipes': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListMatchesCart()
+        response = self.client.delete(url, {'recipes': ids}, format='json')
+        self.assertEqual(
+            [item['status'] for item in response.data],
+            ['not_added', 'not_added']
+        )
+        self.assertListMatchesCart()
+
+    def test_bulk_favorites(self):
+        url = RECIPES_URL + 'favorite/bulk/'
+        ids = [recipe.pk for recipe in self.recipes]
+        for method, expected, count in (
+            ('post', status.HTTP_201_CREATED, 1),
+            ('post', status.HTTP_201_CREATED, 1),
+            ('delete', status.HTTP_200_OK, 0),
+        ):
+            response = getattr(self.client, method)(
+                url, {'recipes': ids}, format='json'
+            )
+            self.assertEqual(response.status_code, expected)
+            for recipe in Recipe.objects.filter(pk__in=ids):
+                self.assertEqual(recipe.favorites_count, count)
+                self.assertEqual(recipe.favorites.count(), count)
+        response = self.client.post(url, {'recipes': [0]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_drifted_list_is_clamped(self):
+        recipe = self.recipes[0]
+        self.client.post(CART_URL.format(recipe.pk))
+        ShoppingListItem.objects.filter(user=self.reader).update(amount=1)
+        response = self.client.delete(CART_URL.format(recipe.pk))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.reader).exists()
+        )
+
+
+class CounterTests(TestCase):
+    """Счётчики не затираются сохранением и не уходят при гонке удалений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.readers = [create_user(f'reader{number}') for number in range(2)]
+        cls.author = create_user('author')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст',
+            image='recipes/images/test.jpg', cooking_time=10
+        )
+        ingredient = Ingredient.objects.create(
+            name='Ингредиент', measurement_unit='г'
+        )
+        RecipeIngredientRelation.objects.create(
+            recipe=cls.recipe, ingredient=ingredient, amount=100
+        )
+
+    def test_full_save_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        for reader in self.readers:
+            Favorite.objects.create(user=reader, recipe=recipe)
+            ShoppingCart.objects.create(user=reader, recipe=recipe)
+        Recipe.objects.create(
+            author=self.author, name='Второй', text='Текст',
+            image='recipes/images/test.jpg', cooking_time=10
+        )
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.first_name = 'Новое имя'
+        author.save()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 2)
+        self.assertEqual(recipe.in_carts_count, 2)
+        self.assertEqual(author.first_name, 'Новое имя')
+        self.assertEqual(author.recipes_count, 2)
+
+    def test_stale_delete_is_counted_once(self):
+        for model in (Favorite, ShoppingCart):
+            for reader in self.readers:
+                model.objects.create(user=reader, recipe=self.recipe)
+            first, second = (
+                model.objects.get(user=self.readers[0]) for _ in range(2)
+            )
+            first.delete()
+            second.delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.in_carts_count, 1)
+        self.assertEqual(
+            set(ShoppingListItem.objects.values_list('user', flat=True)),
+            {self.readers[1].pk}
+        )
+
+
+PDF_OBJECT = re.compile(
+    rb'(\d+) 0 obj\n(.*?)(?:\nstream\n(.*?)\nendstream)?\nendobj\n',
+    re.DOTALL
+)
+PDF_TEXT = re.compile(rb'<([0-9A-F]*)> Tj')
+PDF_CHAR = re.compile(rb'<([0-9A-F]{4})> <([0-9A-F]+)>')
+PDF_FONT_SIZE_LIMIT = 30000
+
+
+def shopping_list_rows(names):
+    return [
+        {
+            'ingredient__name': name, 'ingredient__measurement_unit': 'г',
+            'ingredient_amount': number,
+        }
+        for number, name in enumerate(names, 1)
+    ]
+
+
+class PdfTests(SimpleTestCase):
+    """PDF со списком покупок разбирается обратно в те же строки."""
+
+    def parse(self, data):
+        objects = {
+            int(number): (body, stream)
+            for number, body, stream in PDF_OBJECT.findall(data)
+        }
+        startxref = int(data.rsplit(b'startxref\n', 1)[1].split()[0])
+        xref = data[startxref:].split(b'\n')
+        self.assertEqual(xref[0], b'xref')
+        size = int(xref[1].split()[1])
+        self.assertEqual(set(objects), set(range(1, size)))
+        for number, entry in enumerate(xref[3:size + 2], 1):
+            offset = int(entry.split()[0])
+            self.assertTrue(data[offset:].startswith(b'%d 0 obj' % number))
+        return {
+            number: (body, zlib.decompress(stream)
+                     if b'/FlateDecode' in body else stream)
+            for number, (body, stream) in objects.items()
+        }
+
+    def render(self, names):
+        data = b''.join(render_pdf(shopping_list_rows(names)))
+        objects = self.parse(data)
+        chars = {}
+        for body, stream in objects.values():
+            chars.update(
+                (int(glyph, 16), bytes.fromhex(text.decode()).decode(
+                    'utf-16-be'
+                ))
+                for glyph, text in PDF_CHAR.findall(stream)
+                if b'begincmap' in stream
+            )
+        lines, font_file = [], None
+        for body, stream in objects.values():
+            if b'/Length1' in body:
+                font_file = stream
+            elif stream and stream.startswith(b'BT '):
+                lines.extend(
+                    ''.join(
+                        chars[int(codes[start:start + 4], 16)]
+                        for start in range(0, len(codes), 4)
+                    )
+                    for codes in PDF_TEXT.findall(stream)
+                )
+        pages = sum(b'/Type /Page ' in body for body, _ in objects.values())
+        return data, lines, pages, TrueTypeFont(font_file)
+
+    def test_text_and_pages(self):
+        names = ['Мука', 'Йогурт', 'Яйца', 'Сыр'] * LINES_PER_PAGE
+        _, lines, pages, _ = self.render(names)
+        self.assertEqual(lines, [TITLE, ''] + [
+            f'{name} - {number}, г' for number, name in enumerate(names, 1)
+        ])
+        self.assertEqual(pages, -(-(len(names) + 2) // LINES_PER_PAGE))
+
+    def test_font_is_subset(self):
+        data, _, _, font = self.render(['Йогурт', 'Мука', 'Ёрш'])
+        self.assertLess(len(data), PDF_FONT_SIZE_LIMIT)
+        self.assertEqual(checksum(font.data), CHECKSUM_MAGIC)
+        glyphs = get_font().glyphs
+        for char in 'ЙогуртЁ':
+            self.assertTrue(font.outline(glyphs[ord(char)]))
+        # Составной глиф тянет за собой свои части.
+        parts = list(font.components(font.outline(glyphs[ord('Ё')])))
+        self.assertTrue(parts)
+        self.assertTrue(all(map(font.outline, parts)))
+        for char in 'ЖZ':
+            self.assertFalse(font.outline(glyphs[ord(char)]))
+
+
+class IngredientImportTests(TestCase):
+    """Повторная загрузка не дублирует ингредиенты без единицы."""
+
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        self.paths = {
+            '.csv': f'{folder}/ingredients.csv',
+            '.json': f'{folder}/ingredients.json',
+        }
+        with open(self.paths['.csv'], 'w', encoding='utf-8') as file:
+            file.write('соль,г\nвода\nлёд,\n')
+        with open(self.paths['.json'], 'w', encoding='utf-8') as file:
+            json.dump([
+                {'name': 'соль', 'measurement_unit': 'г'},
+                {'name': 'вода'},
+                {'name': 'лёд', 'measurement_unit': None},
+            ], file)
+
+    def test_import_twice(self):
+        for path in (*self.paths.values(), *self.paths.values()):
+            call_command('csv_importer', path, stdout=StringIO())
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list(
+                'name', 'measurement_unit'
+            )),
+            [('вода', ''), ('лёд', ''), ('соль', 'г')]
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkRecipeTests(TestCase):
+    """Пакет рецептов сохраняет верные и возвращает ошибки остальных."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tag = Tag.objects.create(name='Тег', slug='tag', color='#000000')
+        cls.ingredient = Ingredient.objects.create(
+            name='Ингредиент', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст',
+            image='recipes/images/test.jpg', cooking_time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = authenticated_client(self.author)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def item(self, name, **fields):
+        image = base64.b64encode(image_file('image.png', 'PNG').read())
+        return {
+            'name': name, 'text': 'Текст', 'cooking_time': 5,
+            'image': f'data:image/png;base64,{image.decode()}',
+            'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 10}],
+            **fields,
+        }
+
+    def post(self, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                RECIPES_URL + 'bulk/', items, format='json'
+            )
+
+    def test_partial_success(self):
+        response = self.post([
+            self.item('Новый'),
+            self.item('Без тега', tags=[0]),
+            self.item('Изменённый', id=self.recipe.pk),
+            self.item('Чужой', id=0),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = response.data
+        self.assertEqual([result['index'] for result in results],
+                         [0, 1, 2, 3])
+        self.assertEqual(set(results[1]['errors']), {'tags'})
+        self.assertEqual(set(results[3]['errors']), {'id'})
+        self.assertEqual(results[2]['id'], self.recipe.pk)
+        created = Recipe.objects.get(pk=results[0]['id'])
+        self.assertEqual(created.name, 'Новый')
+        self.assertEqual(list(created.tags.all()), [self.tag])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Изменённый')
+        self.assertEqual(self.recipe.cooking_time, 5)
+        self.assertFalse(Recipe.objects.filter(name='Без тега').exists())
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+        # Пакет проходит через тот же recipes_saved, что и сигнал.
+        self.assertEqual(
+            {job.payload['recipe_id'] for job in Job.objects.filter(
+                name=build_recipe_renditions.__name__
+            )},
+            {self.recipe.pk, created.pk}
+        )
+        self.assertTrue(RecipeIngredientsChange.objects.filter(
+            recipe_id=created.pk
+        ).exists())
+
+    def test_all_or_nothing_statuses(self):
+        response = self.post([self.item('Первый'), self.item('Второй')])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.post([self.item('Ошибка', tags=[0])])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Recipe.objects.count(), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTests(TestCase):
+    """Закэшированные ответы анонимам сбрасываются после изменений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_recipes()
+        cls.recipe = Recipe.objects.latest('pk')
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.author = authenticated_client(self.recipe.author)
+
+    def names(self):
+        return (
+            [recipe['name'] for recipe in
+             self.anonymous.get(RECIPES_URL).data['results']],
+            self.anonymous.get(RECIPE_URL.format(self.recipe.pk)).data['name'],
+        )
+
+    def test_edit_and_create_reset_cache(self):
+        names, name = self.names()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), (names, name))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author.patch(
+                RECIPE_URL.format(self.recipe.pk), {
+                    'name': 'Новое название',
+                    'tags': [tag.pk for tag in self.recipe.tags.all()],
+                    'ingredients': [
+                        {'id': relation.ingredient_id, 'amount': 50}
+                        for relation in self.recipe.related_recipe.all()
+                    ],
+                    'cooking_time': 5,
+                }, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names, name = self.names()
+        self.assertEqual(name, 'Новое название')
+        self.assertEqual(names[0], 'Новое название')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.recipe.author, name='Свежий', text='Текст',
+                image='recipes/images/test.jpg', cooking_time=10
+            )
+        names, _ = self.names()
+        self.assertEqual(names[0], recipe.name)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(TestCase):
+    """ETag выдачи меняется, когда пользователь меняет избранное."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_recipes()
+        cls.recipe = Recipe.objects.exclude(favorites__user=cls.user).first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = authenticated_client(self.user)
+
+    def test_favorite_changes_etag(self):
+        favorite_url = RECIPE_URL.format(self.recipe.pk) + 'favorite/'
+        for url in (RECIPES_URL, RECIPE_URL.format(self.recipe.pk)):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, status.HTTP_304_NOT_MODIFIED
+                )
+                self.assertEqual(
+                    self.client.post(favorite_url).status_code,
+                    status.HTTP_201_CREATED
+                )
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotEqual(response['ETag'], etag)
+                self.client.delete(favorite_url)
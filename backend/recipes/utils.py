@@ -1,16 +1,45 @@
-from django.shortcuts import get_object_or_404
+import hashlib
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404
 from rest_framework import status
+from django.utils.http import quote_etag
 from rest_framework.response import Response
 
+from recipes.collection import (ADDED, REMOVED, add_to_collection,
+                                remove_from_collection)
 from recipes.models import Recipe, RecipeIngredientRelation
+from recipes.pantry import record_ingredient_changes
+from recipes.response_cache import invalidate_recipe_lists, invalidate_recipes
+
+RECIPE_VALIDATOR_FIELDS = (
+    'id', 'updated_at', 'is_favorited', 'is_in_shopping_cart', 'author_id',
+    'author__email', 'author__username', 'author__first_name',
+    'author__last_name',
+)
 
 
 def add_ingredient(add_serializer, model, request, recipe_id):
+    """Добавляем рецепт в избранное или корзину.
+
+    Счётчик и список покупок меняет add_to_collection по результату
+    самой вставки, поэтому параллельные запросы не учтут рецепт дважды.
+    """
     user = request.user
     data = {'user': user.id, 'recipe': recipe_id}
     serializer = add_serializer(data=data, context={'request': request})
     serializer.is_valid(raise_exception=True)
-    serializer.save()
+    recipe = serializer.validated_data['recipe']
+    if add_to_collection(model, user, [recipe.pk])[recipe.pk] != ADDED:
+        # Рецепт успел добавить параллельный запрос: повторная проверка
+        # вернёт ту же ошибку, что и обычный повтор.
+        add_serializer(
+            data=data, context={'request': request}
+        ).is_valid(raise_exception=True)
     return Response(
         serializer.data,
         status=status.HTTP_201_CREATED
@@ -18,12 +47,15 @@ def add_ingredient(add_serializer, model, request, recipe_id):
 
 
 def delete_ingredient(model, request, recipe_id):
-    user = request.user
-    get_object_or_404(
-        model,
-        user=user,
-        recipe=Recipe.objects.get(id=recipe_id)
-    ).delete()
+    """Убираем рецепт; 404, если его нет или этот запрос его не удалил."""
+    try:
+        recipe_id = int(recipe_id)
+    except ValueError:
+        raise Http404
+    if remove_from_collection(
+        model, request.user, [recipe_id]
+    )[recipe_id] != REMOVED:
+        raise Http404
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -36,3 +68,134 @@ def tags_and_ingredients_set(self, recipe, tags, ingredients):
             amount=ingredient['amount']
         ) for ingredient in ingredients]
     )
+
+
+def any_of(conditions):
+    return reduce(or_, conditions)
+
+
+def sync_recipe_relations(relations):
+    """Приводим теги и ингредиенты рецептов к новым значениям по разнице.
+
+    relations - словарь {id рецепта: (id тегов, {id ингредиента:
+    количество})}, None вместо тегов или ингредиентов оставляет их как
+    есть. Незатронутые строки не переписываются; для любого числа
+    рецептов это два чтения и не больше пяти изменяющих запросов.
+    Пакетные операции не вызывают сигналы, поэтому кэш ответов
+    сбрасывается здесь. Возвращает прежние количества ингредиентов
+    {id рецепта: {id ингредиента: количество}}.
+    """
+    RecipeTag = Recipe.tags.through
+    old_tags = defaultdict(set)
+    for recipe_id, tag_id in RecipeTag.objects.filter(
+        recipe__in=relations
+    ).values_list('recipe_id', 'tag_id'):
+        old_tags[recipe_id].add(tag_id)
+    old_rows = defaultdict(dict)
+    old_amounts = defaultdict(dict)
+    for row in RecipeIngredientRelation.objects.filter(recipe__in=relations):
+        old_rows[row.recipe_id][row.ingredient_id] = row
+        old_amounts[row.recipe_id][row.ingredient_id] = row.amount
+    removed_tags, added_tags = [], []
+    removed_ingredients, added_ingredients, changed_amounts = [], [], []
+    for recipe_id, (tags, amounts) in relations.items():
+        if tags is not None:
+            tags = set(tags)
+            if old_tags[recipe_id] - tags:
+                removed_tags.append(
+                    Q(recipe_id=recipe_id,
+                      tag_id__in=old_tags[recipe_id] - tags)
+                )
+            added_tags.extend(
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in tags - old_tags[recipe_id]
+            )
+        if amounts is None:
+            continue
+        rows = old_rows[recipe_id]
+        if rows.keys() - amounts.keys():
+            removed_ingredients.append(
+                Q(recipe_id=recipe_id,
+                  ingredient_id__in=rows.keys() - amounts.keys())
+            )
+        for ingredient_id, amount in amounts.items():
+            row = rows.get(ingredient_id)
+            if row is None:
+                added_ingredients.append(RecipeIngredientRelation(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=amount
+                ))
+            elif row.amount != amount:
+                row.amount = amount
+                changed_amounts.append(row)
+    if removed_tags:
+        RecipeTag.objects.filter(any_of(removed_tags)).delete()
+    if added_tags:
+        RecipeTag.objects.bulk_create(added_tags)
+    if removed_ingredients:
+        RecipeIngredientRelation.objects.filter(
+            any_of(removed_ingredients)
+        ).delete()
+    if changed_amounts:
+        RecipeIngredientRelation.objects.bulk_update(
+            changed_amounts, ('amount',)
+        )
+    if added_ingredients:
+        RecipeIngredientRelation.objects.bulk_create(added_ingredients)
+        record_ingredient_changes(
+            relation.recipe_id for relation in added_ingredients
+        )
+    if removed_tags or added_tags:
+        invalidate_recipe_lists()
+    if any((removed_tags, added_tags, removed_ingredients, changed_amounts,
+            added_ingredients)):
+        invalidate_recipes(relations)
+    return old_amounts
+
+
+def recipes_by_author(author_ids, limit=None):
+    """Последние рецепты авторов одним запросом.
+
+    При заданном limit для каждого автора берутся только первые limit
+    рецептов: нумеруем их оконной функцией ROW_NUMBER в разрезе автора.
+    """
+    if not author_ids:
+        # Для пустого IN Django не строит SQL и поднимает EmptyResultSet.
+        return {}
+    recipes = Recipe.objects.filter(author__in=author_ids).only(
+        'id', 'author', 'name', 'image', 'renditions_source', 'cooking_time'
+    )
+    if limit is not None:
+        ranked = recipes.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('id').desc(),
+        )).order_by()
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+            'ORDER BY id DESC',
+            (*params, limit)
+        )
+    result = {author_id: [] for author_id in author_ids}
+    for recipe in recipes:
+        result[recipe.author_id].append(recipe)
+    return result
+
+
+def recipe_validators(rows, followed_authors, *extra):
+    """Строгий ETag и Last-Modified для выдачи рецептов.
+
+    rows - значения RECIPE_VALIDATOR_FIELDS рецептов из ответа. В ETag
+    входят и флаги текущего пользователя, поэтому закэшированный ответ
+    становится невалидным после добавления рецепта в избранное.
+    """
+    state = [extra]
+    for row in rows:
+        state.append((
+            *(row[field] for field in RECIPE_VALIDATOR_FIELDS),
+            row['author_id'] in followed_authors,
+        ))
+    etag = quote_etag(hashlib.sha256(repr(state).encode()).hexdigest())
+    last_modified = max((row['updated_at'] for row in rows), default=None)
+    return etag, last_modified
@@ -1,24 +1,58 @@
-from django.db.models import Sum
+from django.db.models import Exists, OuterRef, Prefetch, Value
 from django.conf import settings as s
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import FileResponse
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
-from rest_framework import filters, viewsets
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import filters, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (AllowAny, IsAuthenticated)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import LimitPageNumberPagination
+from api.pagination import FeedPagination, LimitPageNumberOrCursorPagination
 from api.permissions import IsAuthorOnlyPermission
-from api.serializers import (TagSerializer, IngredientSerializer,
+from api.renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from api.serializers import (BULK_LIMIT_ERROR, TagSerializer,
+                             IngredientSerializer, RecipeBulkItemSerializer,
+                             PantrySerializer, RecipeIdsSerializer,
+                             ShortRecipeSerializer,
                              RecipeSerializer, FavoriteSerializer,
-                             ShoppingCartAddSerializer, RecipeEditSerializer)
+                             ShoppingCartAddSerializer, RecipeEditSerializer,
+                             ShoppingListItemSerializer, JobSerializer)
+from jobs.registry import enqueue
+from recipes.bulk import check_references, save_recipes
+from recipes.collection import (NOT_FOUND, add_to_collection,
+                                remove_from_collection)
+from recipes.feed import feed_recipe_ids
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (Tag, Ingredient, Recipe, Favorite,
-                            ShoppingCart, RecipeIngredientRelation)
-from recipes.utils import add_ingredient, delete_ingredient
+                            ShoppingCart, RecipeIngredientRelation,
+                            ShoppingListItem)
+from recipes.pantry import pantry_index
+from recipes.response_cache import (cache_response, detail_cache_key,
+                                    get_cached_response, list_cache_key,
+                                    recipe_versions)
+from recipes.shopping_list import (SHOPPING_LIST_EXPORTERS,
+                                   get_shopping_list)
+from recipes.similar import similar_recipes
+from recipes.tasks import export_shopping_list
+from recipes.utils import (RECIPE_VALIDATOR_FIELDS, add_ingredient,
+                           delete_ingredient, recipe_validators)
+from users.utils import get_followed_authors
 
+BULK_LIST_ERROR = 'Ожидается непустой список рецептов.'
 
-CONTENT_TYPE = 'text/plain'
+
+def bulk_status(success, errors, done):
+    """Код ответа пакетной операции: всё удалось, частично или ничего."""
+    if not errors:
+        return success
+    if done:
+        return status.HTTP_207_MULTI_STATUS
+    return status.HTTP_400_BAD_REQUEST
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -48,6 +82,13 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     search_fields = ('name',)
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по названию отвечаем из индекса в памяти."""
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         ingredient = get_object_or_404(
             Ingredient,
@@ -63,15 +104,144 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer, RecipeEditSerializer
     permission_classes = (IsAuthorOnlyPermission,)
-    pagination_class = LimitPageNumberPagination
+    pagination_class = LimitPageNumberOrCursorPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """Загружаем страницу рецептов за фиксированное число запросов.
+
+        Флаги избранного и корзины вычисляются для текущего пользователя
+        прямо в запросе.
+        """
+        user = self.request.user
+        if user.is_anonymous:
+            queryset = Recipe.objects.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        else:
+            queryset = Recipe.objects.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+            )
+        return queryset.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'related_recipe',
+                queryset=RecipeIngredientRelation.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PUT', 'PATCH'):
             return RecipeEditSerializer
         return RecipeSerializer
 
+    def not_modified(self, validators):
+        """Ответ 304, если у клиента актуальная версия выдачи.
+
+        Last-Modified не учитывает флаги пользователя, поэтому условие
+        проверяется только по ETag.
+        """
+        etag, _ = validators
+        response = get_conditional_response(self.request, etag=etag)
+        if response is not None:
+            self.set_validators(response, validators)
+        return response
+
+    def set_validators(self, response, validators):
+        etag, last_modified = validators
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def cached_response(self, key):
+        """Готовый ответ анонимному пользователю из кэша."""
+        cached = get_cached_response(key)
+        if cached is None:
+            return None
+        data, validators = cached
+        return self.not_modified(validators) or self.set_validators(
+            Response(data), validators
+        )
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов с поддержкой условных GET-запросов.
+
+        Страница сначала выбирается лёгким запросом по полям валидатора,
+        полные данные загружаются только если ETag не совпал. Страницы
+        для анонимных пользователей берутся из кэша.
+        """
+        cache_key = None
+        if request.user.is_anonymous:
+            cache_key = list_cache_key(request)
+            response = self.cached_response(cache_key)
+            if response is not None:
+                return response
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.paginate_queryset(
+            queryset.values(*RECIPE_VALIDATOR_FIELDS)
+        )
+        validators = recipe_validators(
+            rows, get_followed_authors(request), self.paginator.get_state()
+        )
+        response = self.not_modified(validators)
+        if response is not None:
+            return response
+        ids = [row['id'] for row in rows]
+        if cache_key:
+            versions = recipe_versions(ids)
+        recipes = queryset.in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        response = self.get_paginated_response(serializer.data)
+        if cache_key:
+            cache_response(cache_key, versions, response.data, validators)
+        return self.set_validators(response, validators)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт с поддержкой условных GET-запросов."""
+        anonymous = request.user.is_anonymous
+        if anonymous:
+            cache_key = detail_cache_key(request, kwargs['pk'])
+            response = self.cached_response(cache_key)
+            if response is not None:
+                return response
+        try:
+            row = self.get_queryset().filter(pk=kwargs['pk']).values(
+                *RECIPE_VALIDATOR_FIELDS
+            ).first()
+        except ValueError:
+            row = None
+        if row is not None:
+            validators = recipe_validators(
+                (row,), get_followed_authors(request)
+            )
+            response = self.not_modified(validators)
+            if response is not None:
+                return response
+            if anonymous:
+                versions = recipe_versions((row['id'],))
+        response = super().retrieve(request, *args, **kwargs)
+        if row is not None:
+            if anonymous:
+                cache_response(cache_key, versions, response.data,
+                               validators)
+            self.set_validators(response, validators)
+        return response
+
     @action(
         detail=True,
         methods=('POST', 'DELETE'),
@@ -106,24 +276,231 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        methods=('GET',),
+        methods=('POST',),
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk(self, request):
+        """Пакетное создание и изменение рецептов.
+
+        Рецепты с ошибками пропускаются, остальные сохраняются одной
+        транзакцией. Для каждого рецепта в ответе id или ошибки.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'detail': BULK_LIST_ERROR}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > s.BULK_RECIPES_LIMIT:
+            return Response(
+                {'detail': BULK_LIMIT_ERROR},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        valid, errors = {}, {}
+        for index, item in enumerate(items):
+            serializer = RecipeBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                valid[index] = serializer.validated_data
+            else:
+                errors[index] = serializer.errors
+        for index, item_errors in check_references(
+            valid, request.user
+        ).items():
+            errors[index] = item_errors
+            del valid[index]
+        saved = {}
+        if valid:
+            saved = dict(zip(
+                valid, save_recipes(request.user, list(valid.values()))
+            ))
+        results = [
+            {'index': index, 'id': saved[index].pk} if index in saved
+            else {'index': index, 'errors': errors[index]}
+            for index in range(len(items))
+        ]
+        return Response(
+            results,
+            status=bulk_status(status.HTTP_201_CREATED, errors, saved)
+        )
+
+    def change_collection(self, request, model):
+        """Пакетно добавляем (POST) или убираем (DELETE) рецепты.
+
+        Для каждого id в ответе итог: added, already_added, removed,
+        not_added или not_found. Ошибкой считается только not_found.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            outcomes = add_to_collection(model, request.user, recipe_ids)
+            success = status.HTTP_201_CREATED
+        else:
+            outcomes = remove_from_collection(model, request.user, recipe_ids)
+            success = status.HTTP_200_OK
+        not_found = [pk for pk, outcome in outcomes.items()
+                     if outcome == NOT_FOUND]
+        return Response(
+            [
+                {'id': pk, 'status': outcome}
+                for pk, outcome in outcomes.items()
+            ],
+            status=bulk_status(
+                success, not_found, len(not_found) < len(outcomes)
+            )
+        )
+
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='favorite/bulk',
         permission_classes=(IsAuthenticated,)
     )
+    def favorite_bulk(self, request):
+        """Пакетно добавляем или удаляем рецепты в избранном."""
+        return self.change_collection(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='shopping_cart/bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_bulk(self, request):
+        """Пакетно добавляем или удаляем рецепты в корзине покупок."""
+        return self.change_collection(request, ShoppingCart)
+
+    @action(detail=False, methods=('GET',), pagination_class=None)
+    def pantry(self, request):
+        """Что приготовить из имеющихся продуктов.
+
+        ?ingredients= повторяется для каждого продукта. Сначала рецепты,
+        которым не хватает меньше ингредиентов, затем с большей долей
+        имеющихся.
+        """
+        params = PantrySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        matches = pantry_index.search(
+            params.validated_data['ingredients'],
+            params.validated_data['max_missing'],
+            params.validated_data['limit']
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        return Response([
+            {
+                **self.get_serializer(recipes[recipe_id]).data,
+                'missing': missing,
+                'coverage': round(present / (present + missing), 3),
+            }
+            for recipe_id, present, missing in matches
+            if recipe_id in recipes
+        ])
+
+    @action(detail=True, methods=('GET',), pagination_class=None)
+    def similar(self, request, pk):
+        """Рецепты с похожим набором ингредиентов из MinHash-индекса."""
+        if not pk.isdigit() or not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        try:
+            limit = int(request.query_params.get('limit', s.SIMILAR_LIMIT))
+        except ValueError:
+            limit = s.SIMILAR_LIMIT
+        limit = min(max(limit, 1), s.SIMILAR_CANDIDATES)
+        scores = similar_recipes(int(pk), limit)
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'renditions_source', 'cooking_time'
+        ).in_bulk([recipe_id for recipe_id, _ in scores])
+        return Response([
+            {
+                **ShortRecipeSerializer(
+                    recipes[recipe_id], context={'request': request}
+                ).data,
+                'similarity': round(score, 3),
+            }
+            for recipe_id, score in scores if recipe_id in recipes
+        ])
+
+    @action(
+        detail=False,
+        methods=('GET',),
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        """Лента рецептов авторов из подписок, новые первыми."""
+        ids = self.paginator.paginate_ids(
+            lambda before, limit: feed_recipe_ids(
+                request.user, before, limit
+            ),
+            request
+        )
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=('GET',),
+        permission_classes=(IsAuthenticated,),
+        pagination_class=None
+    )
+    def shopping_list(self, request):
+        """Текущий список покупок."""
+        serializer = ShoppingListItemSerializer(
+            ShoppingListItem.objects.filter(user=request.user).select_related(
+                'ingredient'
+            ).order_by('ingredient__name'),
+            many=True
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=('GET',),
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, JSONRenderer, CSVRenderer,
+                          PDFRenderer)
+    )
     def download_shopping_cart(self, request):
-        """Загружаем список покупок в формате .txt"""
-        ingredients = RecipeIngredientRelation.objects.filter(
-            recipe__groceries__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(ingredient_amount=Sum('amount'))
-        groceries = ['Список покупок:\n']
-        for ingredient in ingredients:
-            name = ingredient['ingredient__name']
-            unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['ingredient_amount']
-            groceries.append(f'\n{name} - {amount}, {unit}')
-        response = FileResponse(groceries, content_type=CONTENT_TYPE)
+        """Загружаем список покупок в формате .txt, .csv или .pdf"""
+        renderer = request.accepted_renderer
+        if renderer.format not in SHOPPING_LIST_EXPORTERS:
+            # JSON остаётся для ошибок и клиентов с Accept:
+            # application/json, файл для них - текстовый, как раньше.
+            renderer = PlainTextRenderer()
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = FileResponse(
+            SHOPPING_LIST_EXPORTERS[renderer.format](
+                get_shopping_list(request.user)
+            ),
+            content_type=content_type
+        )
         response['Content-Disposition'] = (
-            f'attachment; filename="{s.FILENAME}"'
+            f'attachment; filename="{s.FILENAME}.{renderer.format}"'
         )
         return response
+
+    @action(
+        detail=False,
+        methods=('POST',),
+        permission_classes=(IsAuthenticated,)
+    )
+    def export_shopping_cart(self, request):
+        """Ставим выгрузку списка покупок в очередь фоновых задач."""
+        export_format = request.data.get('format', 'txt')
+        if export_format not in SHOPPING_LIST_EXPORTERS:
+            return Response(
+                {'format': f'Доступные форматы: '
+                           f'{", ".join(SHOPPING_LIST_EXPORTERS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        job = enqueue(export_shopping_list, request.user,
+                      user_id=request.user.id, export_format=export_format)
+        return Response(
+            JobSerializer(job).data, status=status.HTTP_202_ACCEPTED
+        )
@@ -3,10 +3,33 @@ from django.conf import settings as s
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Не даёт полному save() затирать счётчики старыми значениями.
+
+    Счётчики меняются только выражением F() в обход экземпляра, поэтому
+    при обновлении строки они исключаются из update_fields.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            skipped = self.get_deferred_fields() | set(self.counter_fields)
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """Кастомная модель пользователя."""
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
+    counter_fields = ('recipes_count',)
 
     email = models.CharField(
         verbose_name='Адрес электронной почты',
@@ -40,6 +63,16 @@ class User(AbstractUser):
         blank=False,
         null=False
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
+    feed_on_read = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Рецепты в ленты подписчиков добавляются при чтении',
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -73,6 +106,11 @@ class Follow(models.Model):
                 name='unique_follow'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'subscriber'), name='follow_author_idx'
+            ),
+        )
 
     def __str__(self):
         return f'Пользователь {self.subscriber} подписан на {self.author}'
@@ -0,0 +1,72 @@
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import Follow, User
+
+SUBSCRIPTIONS_URL = '/api/users/subscriptions/'
+AUTHORS_COUNT = 5
+PAGE_SIZES = (1, 3, AUTHORS_COUNT)
+# Число запросов не зависит ни от числа авторов на странице, ни от
+# recipes_limit.
+SUBSCRIPTIONS_QUERY_BUDGET = 3
+
+
+class SubscriptionsTests(TestCase):
+    """Страница подписок пользователя."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@foodgram.local', username='reader',
+            first_name='Читатель', last_name='Тестовый', password='password'
+        )
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{number}@foodgram.local',
+                username=f'author{number}', first_name='Автор',
+                last_name='Тестовый', password='password'
+            )
+            for number in range(AUTHORS_COUNT)
+        ]
+        for author in cls.authors:
+            for number in range(4):
+                Recipe.objects.create(
+                    author=author, name=f'Рецепт {number}', text='Текст',
+                    image='recipes/images/test.jpg', cooking_time=10
+                )
+        cls.follower = User.objects.create_user(
+            email='follower@foodgram.local', username='follower',
+            first_name='Подписчик', last_name='Тестовый',
+            password='password'
+        )
+        Follow.objects.bulk_create(
+            Follow(subscriber=cls.follower, author=author)
+            for author in cls.authors
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_no_follows(self):
+        """Без подписок страница пустая, и с recipes_limit тоже."""
+        for params in ({}, {'recipes_limit': 3}):
+            with self.subTest(params=params):
+                response = self.client.get(SUBSCRIPTIONS_URL, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data['results'], [])
+
+    def test_query_budget(self):
+        self.client.force_authenticate(self.follower)
+        for limit in PAGE_SIZES:
+            for recipes_limit in ('', 1, 3):
+                with self.subTest(limit=limit, recipes_limit=recipes_limit):
+                    params = {'limit': limit}
+                    if recipes_limit:
+                        params['recipes_limit'] = recipes_limit
+                    with self.assertNumQueries(SUBSCRIPTIONS_QUERY_BUDGET):
+                        response = self.client.get(SUBSCRIPTIONS_URL, params)
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertEqual(len(response.data['results']), limit)
@@ -0,0 +1,27 @@
+from users.models import Follow
+
+FOLLOWED_AUTHORS_ATTR = '_followed_author_ids'
+
+
+def get_followed_authors(request):
+    """Множество id авторов, на которых подписан текущий пользователь.
+
+    Загружается одним запросом и кэшируется на объекте запроса.
+    """
+    if request is None or request.user.is_anonymous:
+        return frozenset()
+    followed = getattr(request, FOLLOWED_AUTHORS_ATTR, None)
+    if followed is None:
+        followed = frozenset(
+            Follow.objects.filter(
+                subscriber=request.user
+            ).values_list('author_id', flat=True)
+        )
+        setattr(request, FOLLOWED_AUTHORS_ATTR, followed)
+    return followed
+
+
+def invalidate_followed_authors(request):
+    """Сбрасываем кэш подписок после их изменения."""
+    if hasattr(request, FOLLOWED_AUTHORS_ATTR):
+        delattr(request, FOLLOWED_AUTHORS_ATTR)
@@ -1,3 +1,4 @@
+from django.db.models import Value
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -5,10 +6,12 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from api.pagination import LimitPageNumberPagination
+from api.pagination import LimitPageNumberOrCursorPagination
 from api.serializers import (UserSerializer, UserCreateSerializer,
                              FollowSerializer)
+from recipes.utils import recipes_by_author
 from users.models import User, Follow
+from users.utils import invalidate_followed_authors
 
 
 class CustomUserViewSet(UserViewSet):
@@ -16,7 +19,7 @@ class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer, UserCreateSerializer
     permission_classes = (IsAuthenticated,)
-    pagination_class = LimitPageNumberPagination
+    pagination_class = LimitPageNumberOrCursorPagination
 
     def get_serializer_class(self):
         """Выбираем сериализатор."""
@@ -45,14 +48,21 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         """Подписки пользователя."""
+        authors = self.paginate_queryset(
+            User.objects.filter(followed__subscriber=request.user).annotate(
+                is_subscribed=Value(True)
+            ).order_by('-id')
+        )
+        limit = request.GET.get('recipes_limit')
+        context = {
+            'request': request,
+            'recipes_by_author': recipes_by_author(
+                [author.id for author in authors],
+                int(limit) if limit else None
+            ),
+        }
         return self.get_paginated_response(
-            FollowSerializer(
-                self.paginate_queryset(
-                    User.objects.filter(followed__subscriber=request.user)
-                ),
-                many=True,
-                context={'request': request},
-            ).data
+            FollowSerializer(authors, many=True, context=context).data
         )
 
     @action(
@@ -69,10 +79,12 @@ class CustomUserViewSet(UserViewSet):
                 author, data=request.data, context={'request': request})
             serializer.is_valid(raise_exception=True)
             Follow.objects.create(subscriber=request.user, author=author)
+            invalidate_followed_authors(request)
             return Response(serializer.data,
                             status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
             get_object_or_404(Follow, subscriber=request.user,
                               author=author).delete()
+            invalidate_followed_authors(request)
             return Response({'detail': 'Успешная отписка'},
                             status=status.HTTP_204_NO_CONTENT)